@@ -1,40 +1,211 @@
 """Flask API for Terraform parser."""
 
-import json
 import os
+import re
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Any
 
+import orjson
 from flask import Flask, jsonify, request, send_from_directory
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+from werkzeug.exceptions import NotFound
+
+from .parser import TerraformParser, list_tf_dir, walk_tf_dirs
+
+
+class _OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes and decodes with orjson."""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get("indent"):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        return orjson.loads(s)
+
+
+# Webpack bundles carry a content hash in their name (bundle.<contenthash>.js)
+_HASHED_ASSET_RE = re.compile(r"\.[0-9a-f]{16,}\.\w+$")
+_HASHED_ASSET_MAX_AGE = 365 * 24 * 60 * 60
+
+
+class _FrontendFlask(Flask):
+    """Flask app that lets browsers keep content-hashed frontend bundles."""
+
+    def get_send_file_max_age(self, filename: str | None) -> int | None:
+        # A hashed name never changes content, so it can be cached for a year;
+        # everything else (index.html in particular) is revalidated via its ETag
+        if filename and _HASHED_ASSET_RE.search(filename):
+            return _HASHED_ASSET_MAX_AGE
+        return 0
 
-from .parser import TerraformParser
 
 # Initialize Flask app
-app = Flask(__name__, static_folder="../work/frontend/build", static_url_path="/")
+app = _FrontendFlask(
+    __name__, static_folder="../work/frontend/build", static_url_path="/"
+)
+app.json = _OrjsonProvider(app)
 CORS(app)
 
+# Background parses started with {"async": true}. Each job's status response is
+# kept as a file so any server worker process can answer a poll; jobs expire
+# after _PARSE_JOB_TTL seconds.
+_parse_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="tf-parse")
+_PARSE_JOBS_DIR = Path("work/jobs")
+_PARSE_JOB_TTL = 60 * 60
+_JOB_ID_RE = re.compile(r"[0-9a-f]{32}")
+
+# (mtime_ns, size) of the entities file and the /api/entities body encoded from it
+_entities_response: tuple[tuple[int, int], bytes] | None = None
+
 
-def parse_terraform(directory: str, output_path: str) -> dict:
+def _split_paths(value: str) -> tuple[str, ...]:
+    """Split a comma-separated list of paths, dropping blank entries."""
+    return tuple(path for path in (p.strip() for p in value.split(",")) if path)
+
+
+# The environment is fixed for the life of the process, so resolve scan paths once
+_ENTITY_SCAN_PATHS = _split_paths(
+    os.environ.get(
+        "TF_SCAN_PATHS",
+        "/app/terraform-examples,/app/project/terraform,/app/project/helm",
+    )
+)
+_LISTED_SCAN_PATHS = _split_paths(
+    os.environ.get("TF_SCAN_PATHS", "/app/project/terraform,/app/project/helm")
+)
+
+# Per-directory (mtime_ns, .tf file count, subdirectories) from earlier scans. Only
+# directories under the scanned roots are kept; ones that disappear are pruned.
+_dir_listings: dict[str, tuple[int, int, list[str]]] = {}
+
+# Scan-path counts stop here so a huge mounted tree cannot stall the UI request
+_TF_COUNT_LIMIT = 10_000
+
+
+def _count_tf_files(root: str) -> tuple[int, bool]:
+    """Count .tf files under root, relisting only directories whose mtime changed.
+
+    Adding, removing or renaming an entry bumps its directory's mtime, so an
+    unchanged directory can reuse its previous listing for one stat call. The
+    walk stops once _TF_COUNT_LIMIT files have been counted; the returned flag
+    says whether the count was cut off there.
+    """
+    seen: set[str] = set()
+
+    def list_dir(directory: str) -> tuple[int, list[str]]:
+        mtime = os.stat(directory).st_mtime_ns
+        seen.add(directory)
+        listing = _dir_listings.get(directory)
+        if listing is None or listing[0] != mtime:
+            tf_files, subdirs = list_tf_dir(directory)
+            listing = (mtime, len(tf_files), subdirs)
+            _dir_listings[directory] = listing
+        return listing[1], listing[2]
+
+    total = 0
+    for count in walk_tf_dirs(root, list_dir):
+        total += count
+        if total >= _TF_COUNT_LIMIT:
+            return _TF_COUNT_LIMIT, True
+
+    # A complete walk visited every live directory under root; forget the rest
+    prefix = os.path.join(root, "")
+    for directory in list(_dir_listings):
+        if directory not in seen and (
+            directory == root or directory.startswith(prefix)
+        ):
+            del _dir_listings[directory]
+    return total, False
+
+
+def parse_terraform(
+    directory: str, output_path: str, parallel: bool = True, use_cache: bool = True
+) -> dict:
     """Parse Terraform files from a directory."""
-    parser = TerraformParser(directory)
+    global _entities_response
+
+    parser = TerraformParser(directory, parallel=parallel, use_cache=use_cache)
     result = parser.parse_directory()
-    parser.save_to_json(output_path)
+    parser.save_to_json(output_path, result=result)
+    # The entities file may have just been rewritten within the mtime resolution
+    _entities_response = None
     return result
 
 
+def _write_parse_job(job_id: str, state: dict[str, Any]) -> None:
+    """Atomically replace a job's status file with the given status response."""
+    path = _PARSE_JOBS_DIR / f"{job_id}.json"
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(app.json.dumps(state) + "\n")
+    os.replace(tmp_path, path)
+
+
+def _prune_parse_jobs() -> None:
+    """Delete status files of jobs older than _PARSE_JOB_TTL."""
+    cutoff = time.time() - _PARSE_JOB_TTL
+    for path in _PARSE_JOBS_DIR.glob("*.json"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except OSError:
+            # Already removed by another worker
+            continue
+
+
+def _run_parse_job(job_id: str, directory: str, output_path: str) -> None:
+    """Parse a directory in the background and record the outcome for polling."""
+    try:
+        # Serial parse, so concurrent background jobs don't each start a process pool
+        result = parse_terraform(directory, output_path, parallel=False)
+        state = {
+            "job_id": job_id,
+            "status": "done",
+            "success": True,
+            "data": result,
+            "source": directory,
+        }
+    except Exception as e:
+        state = {
+            "job_id": job_id,
+            "status": "failed",
+            "success": False,
+            "error": str(e),
+        }
+    _write_parse_job(job_id, state)
+
+
+def _frontend_folder() -> str | None:
+    """Return the frontend build folder, or None when serving it is disabled."""
+    # Tests and API-only runs set this to skip probing for the frontend build
+    if os.environ.get("TF_VISUALIZER_SKIP_FRONTEND") == "1":
+        return None
+    return app.static_folder
+
+
 @app.route("/")
 @app.route("/<path:path>")
 def serve_frontend(path=""):
     """Serve the React frontend."""
-    if (
-        path
-        and app.static_folder
-        and os.path.exists(os.path.join(app.static_folder, path))
-    ):
-        return send_from_directory(app.static_folder, path)
-    if app.static_folder:
-        return send_from_directory(app.static_folder, "index.html")
-    return jsonify({"error": "Frontend not configured"}), 404
+    static_folder = _frontend_folder()
+    if not static_folder:
+        return jsonify({"error": "Frontend not configured"}), 404
+    if path:
+        # send_from_directory already stats the file, so let it report misses
+        try:
+            return send_from_directory(static_folder, path)
+        except NotFound:
+            pass
+    return send_from_directory(static_folder, "index.html")
 
 
 @app.route("/health", methods=["GET"])
@@ -45,6 +216,15 @@ def health_check():
     )
 
 
+# Copy buffer for saving uploads; Terraform files can run to several MiB
+_UPLOAD_BUFFER_SIZE = 1 << 20
+
+
+def _is_tf_upload(filename: str | None) -> bool:
+    """Return whether an uploaded file name is a Terraform source file."""
+    return filename is not None and filename.endswith(".tf")
+
+
 @app.route("/api/parse", methods=["POST"])
 def parse_terraform_files():
     """Parse uploaded Terraform files."""
@@ -56,28 +236,30 @@ def parse_terraform_files():
     if not files:
         return jsonify({"error": "No files uploaded"}), 400
 
-    # Create temporary directory for uploaded files
-    temp_dir = Path("work/uploads")
-    temp_dir.mkdir(parents=True, exist_ok=True)
+    # The picker also offers .tfvars/.hcl files; those are skipped, and filtering
+    # happens before anything is written to disk
+    files = [f for f in files if _is_tf_upload(f.filename)]
+    if not files:
+        return jsonify({"error": "No .tf files uploaded"}), 400
+
+    # Each request gets its own directory, removed with everything in it
+    with tempfile.TemporaryDirectory(prefix="tfparse_") as upload_dir:
+        temp_dir = Path(upload_dir)
 
-    try:
-        # Save uploaded files
-        for file in files:
-            if file.filename and file.filename.endswith(".tf"):
-                file_path = temp_dir / file.filename
-                file.save(str(file_path))
+        try:
+            # Save uploaded files
+            for file in files:
+                file_path = temp_dir / str(file.filename)
+                file.save(str(file_path), buffer_size=_UPLOAD_BUFFER_SIZE)
 
-        # Parse the files
-        output_path = "work/build/tf_entities.json"
-        result = parse_terraform(str(temp_dir), output_path)
+            # Parse the files
+            output_path = "work/build/tf_entities.json"
+            # Upload directories are never seen again, so don't cache their parse
+            result = parse_terraform(str(temp_dir), output_path, use_cache=False)
 
-        return jsonify({"success": True, "data": result})
-    except Exception as e:
-        return jsonify({"success": False, "error": str(e)}), 500
-    finally:
-        # Clean up temporary files
-        for file_path in temp_dir.glob("*.tf"):
-            file_path.unlink()
+            return jsonify({"success": True, "data": result})
+        except Exception as e:
+            return jsonify({"success": False, "error": str(e)}), 500
 
 
 @app.route("/api/parse-directory", methods=["POST"])
@@ -107,8 +289,18 @@ def parse_terraform_directory():
     if not os.path.exists(directory):
         return jsonify({"error": f"Directory {directory} does not exist"}), 404
 
+    output_path = "work/build/tf_entities.json"
+
+    # Large trees can be parsed in the background instead of holding the worker
+    if data.get("async"):
+        job_id = uuid.uuid4().hex
+        _PARSE_JOBS_DIR.mkdir(parents=True, exist_ok=True)
+        _prune_parse_jobs()
+        _write_parse_job(job_id, {"job_id": job_id, "status": "running"})
+        _parse_executor.submit(_run_parse_job, job_id, directory, output_path)
+        return jsonify({"job_id": job_id, "status": "running"}), 202
+
     try:
-        output_path = "work/build/tf_entities.json"
         result = parse_terraform(directory, output_path)
 
         return jsonify({"success": True, "data": result, "source": directory})
@@ -116,20 +308,32 @@ def parse_terraform_directory():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+@app.route("/api/parse-status/<job_id>", methods=["GET"])
+def get_parse_status(job_id):
+    """Report the state of a background directory parse."""
+    # Job ids are hex, so anything else can never name a status file
+    if _JOB_ID_RE.fullmatch(job_id):
+        path = _PARSE_JOBS_DIR / f"{job_id}.json"
+        try:
+            if path.stat().st_mtime >= time.time() - _PARSE_JOB_TTL:
+                return app.response_class(
+                    path.read_bytes(), mimetype="application/json"
+                )
+        except OSError:
+            pass
+    return jsonify({"error": f"Unknown parse job {job_id}"}), 404
+
+
 @app.route("/api/entities", methods=["GET"])
 def get_entities():
     """Get cached entities from last parse."""
+    global _entities_response
+
     entities_file = "work/build/tf_entities.json"
 
     if not os.path.exists(entities_file):
         # Try to parse from configured paths or defaults
-        scan_paths = os.environ.get(
-            "TF_SCAN_PATHS",
-            "/app/terraform-examples,/app/project/terraform,/app/project/helm",
-        ).split(",")
-
-        for path in scan_paths:
-            path = path.strip()
+        for path in _ENTITY_SCAN_PATHS:
             if os.path.exists(path):
                 try:
                     result = parse_terraform(path, entities_file)
@@ -165,80 +369,90 @@ def get_entities():
                 }
             ), 404
 
-    # Load cached entities
+    # Load cached entities, reusing the encoded response while the file is unchanged
     try:
-        with open(entities_file, "r") as f:
-            data = json.load(f)
-        return jsonify({"success": True, "data": data})
+        st = os.stat(entities_file)
+        stamp = (st.st_mtime_ns, st.st_size)
+        cached = _entities_response
+        if cached is None or cached[0] != stamp:
+            with open(entities_file, "rb") as f:
+                data = orjson.loads(f.read())
+            body = app.json.dumps({"success": True, "data": data})
+            cached = (stamp, f"{body}\n".encode())
+            _entities_response = cached
+        return app.response_class(cached[1], mimetype="application/json")
     except Exception as e:
         return jsonify(
             {"success": False, "error": f"Failed to load entities: {str(e)}"}
         ), 500
 
 
-@app.route("/api/sample", methods=["GET"])
-def get_sample_data():
-    """Get sample data for testing."""
-    sample_data = {
-        "entities": [
-            {
-                "id": "provider.aws",
-                "type": "provider",
-                "name": "aws",
-                "provider": "aws",
-                "category": "provider",
-                "attributes": {"region": "us-east-1"},
-                "dependencies": [],
-                "position": {"x": 0, "y": 0},
-            },
-            {
-                "id": "resource.aws_vpc.main",
-                "type": "aws_vpc",
-                "name": "main",
-                "provider": "aws",
-                "category": "network",
-                "attributes": {
-                    "cidr_block": "10.0.0.0/16",
-                    "enable_dns_hostnames": True,
-                },
-                "dependencies": ["provider.aws"],
-                "position": {"x": 200, "y": 0},
-            },
-            {
-                "id": "resource.aws_subnet.public",
-                "type": "aws_subnet",
-                "name": "public",
-                "provider": "aws",
-                "category": "network",
-                "attributes": {
-                    "cidr_block": "10.0.1.0/24",
-                    "availability_zone": "us-east-1a",
-                },
-                "dependencies": ["resource.aws_vpc.main"],
-                "position": {"x": 400, "y": 0},
-            },
-        ],
-        "relationships": [
-            {
-                "source": "provider.aws",
-                "target": "resource.aws_vpc.main",
-                "type": "provides",
+# Static demo payload for /api/sample, encoded once at import
+_SAMPLE_DATA = {
+    "entities": [
+        {
+            "id": "provider.aws",
+            "type": "provider",
+            "name": "aws",
+            "provider": "aws",
+            "category": "provider",
+            "attributes": {"region": "us-east-1"},
+            "dependencies": [],
+            "position": {"x": 0, "y": 0},
+        },
+        {
+            "id": "resource.aws_vpc.main",
+            "type": "aws_vpc",
+            "name": "main",
+            "provider": "aws",
+            "category": "network",
+            "attributes": {
+                "cidr_block": "10.0.0.0/16",
+                "enable_dns_hostnames": True,
             },
-            {
-                "source": "resource.aws_vpc.main",
-                "target": "resource.aws_subnet.public",
-                "type": "contains",
+            "dependencies": ["provider.aws"],
+            "position": {"x": 200, "y": 0},
+        },
+        {
+            "id": "resource.aws_subnet.public",
+            "type": "aws_subnet",
+            "name": "public",
+            "provider": "aws",
+            "category": "network",
+            "attributes": {
+                "cidr_block": "10.0.1.0/24",
+                "availability_zone": "us-east-1a",
             },
-        ],
-        "metadata": {
-            "total_entities": 3,
-            "total_relationships": 2,
-            "providers": ["aws"],
-            "resource_types": ["aws_vpc", "aws_subnet"],
+            "dependencies": ["resource.aws_vpc.main"],
+            "position": {"x": 400, "y": 0},
         },
-    }
+    ],
+    "relationships": [
+        {
+            "source": "provider.aws",
+            "target": "resource.aws_vpc.main",
+            "type": "provides",
+        },
+        {
+            "source": "resource.aws_vpc.main",
+            "target": "resource.aws_subnet.public",
+            "type": "contains",
+        },
+    ],
+    "metadata": {
+        "total_entities": 3,
+        "total_relationships": 2,
+        "providers": ["aws"],
+        "resource_types": ["aws_vpc", "aws_subnet"],
+    },
+}
+_SAMPLE_BODY = (app.json.dumps({"success": True, "data": _SAMPLE_DATA}) + "\n").encode()
 
-    return jsonify({"success": True, "data": sample_data})
+
+@app.route("/api/sample", methods=["GET"])
+def get_sample_data():
+    """Get sample data for testing."""
+    return app.response_class(_SAMPLE_BODY, mimetype="application/json")
 
 
 @app.route("/api/scan-paths", methods=["GET"])
@@ -247,33 +461,30 @@ def get_scan_paths():
     paths = []
 
     # Check configured paths
-    scan_paths = os.environ.get(
-        "TF_SCAN_PATHS", "/app/project/terraform,/app/project/helm"
-    ).split(",")
-
-    for path in scan_paths:
-        path = path.strip()
+    for path in _LISTED_SCAN_PATHS:
         if os.path.exists(path):
-            # Count .tf files in the directory
-            tf_files = list(Path(path).rglob("*.tf"))
+            file_count, capped = _count_tf_files(path)
             paths.append(
                 {
                     "path": path,
                     "name": os.path.basename(path),
                     "exists": True,
-                    "file_count": len(tf_files),
+                    "file_count": file_count,
+                    # True when file_count stopped at the limit (show as "N+")
+                    "file_count_capped": capped,
                 }
             )
 
     # Add test data if available
     if os.path.exists("/app/test-terraform"):
-        tf_files = list(Path("/app/test-terraform").rglob("*.tf"))
+        file_count, capped = _count_tf_files("/app/test-terraform")
         paths.append(
             {
                 "path": "/app/test-terraform",
                 "name": "test-terraform",
                 "exists": True,
-                "file_count": len(tf_files),
+                "file_count": file_count,
+                "file_count_capped": capped,
                 "is_test": True,
             }
         )
@@ -1,12 +1,175 @@
 """Terraform configuration parser that extracts entities and relationships."""
 
+import hashlib
 import json
-from dataclasses import asdict, dataclass
+import multiprocessing
+import os
+import re
+from collections import defaultdict
+from collections.abc import Callable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import cache
 from pathlib import Path
-from typing import Any
+from typing import TYPE_CHECKING, Any, BinaryIO, TypeVar
+
+import orjson
+
+if TYPE_CHECKING:
+    from lark import Lark
+
+# Parse caches live here, one file per scanned directory (keyed by its absolute
+# path), so scanned source trees are never written to and may be read-only
+CACHE_DIR = Path(os.environ.get("TF_PARSE_CACHE_DIR", "work/cache/tf-parse"))
+
+_T = TypeVar("_T")
+
+# Below this much source to parse, worker start-up costs more than parallelism saves
+_PARALLEL_MIN_BYTES = 64 * 1024
+
+# Terraform reference patterns, unioned so each string is scanned once.
+# Group names map to the id prefix of the referenced entity. The leading \b
+# anchors matches to identifier starts, so `\w+` is never retried from inside
+# a word (e.g. "my_aws_x.y" or "aws_aws_aws_...") and scanning stays linear.
+_REF_RE = re.compile(
+    r"\b(?:"
+    # AWS/Azure/Google resources without explicit 'resource' prefix
+    r"(?P<provider_resource>(?:aws|azurerm|google)_\w+\.\w+)"
+    # Explicit resource references
+    r"|resource\.(?P<resource>\w+\.\w+)"
+    # Data sources
+    r"|data\.(?P<data>\w+\.\w+)"
+    # Modules
+    r"|module\.(?P<module>\w+)"
+    # Variables
+    r"|var\.(?P<var>\w+)"
+    # Locals
+    r"|local\.(?P<local>\w+)"
+    # Outputs
+    r"|output\.(?P<output>\w+)"
+    r")"
+)
+_REF_PREFIXES = {
+    "provider_resource": "resource",
+    "resource": "resource",
+    "data": "data",
+    "module": "module",
+    "var": "var",
+    "local": "local",
+    "output": "output",
+}
+
+
+@cache
+def _provider_of(type_name: str) -> str:
+    """Return the provider prefix of a resource/data type (aws_instance -> aws)."""
+    return type_name.partition("_")[0]
+
+
+@cache
+def _hcl_parser() -> "Lark | None":
+    """Build a LALR parser for python-hcl2's grammar without position tracking.
+
+    hcl2.loads always propagates token positions for its with_meta option, which
+    is never used here; skipping them parses ~30% faster with identical output.
+    Returns None if the grammar cannot be loaded, so callers use hcl2.loads.
+    """
+    import hcl2.parser
+    import lark
+
+    try:
+        return lark.Lark.open(
+            "hcl2.lark", parser="lalr", rel_to=hcl2.parser.__file__, cache=True
+        )
+    except (OSError, lark.exceptions.LarkError):
+        return None
+
+
+@cache
+def _worker_context() -> multiprocessing.context.BaseContext:
+    """Start method for parse workers that is safe from multi-threaded callers."""
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+def _hcl_loads(text: str) -> dict:
+    """Parse HCL2 source into the same dict structure as hcl2.loads.
+
+    hcl2 and lark are imported on first use: building the grammar at import time
+    would tax every importer, including those that only need TerraformEntity.
+    """
+    import hcl2
+    from hcl2.transformer import DictTransformer
+
+    parser = _hcl_parser()
+    if parser is None:
+        return hcl2.loads(text)
+    # Same trailing newline hcl2.loads appends: the grammar has no EOF token
+    parsed: dict = DictTransformer().transform(parser.parse(text + "\n"))
+    return parsed
+
+
+@cache
+def _cache_version() -> str:
+    """Digest of this module, so changing the parser invalidates cached results."""
+    return hashlib.blake2b(Path(__file__).read_bytes(), digest_size=16).hexdigest()
+
+
+def _read_source(file_path: str | Path) -> str:
+    """Read a Terraform file with a single fstat-sized read(), bypassing text IO."""
+    fd = os.open(file_path, os.O_RDONLY)
+    try:
+        chunks = []
+        # Ask for one byte past st_size: a short read means EOF was already reached
+        want = os.fstat(fd).st_size + 1
+        while True:
+            chunk = os.read(fd, want)
+            chunks.append(chunk)
+            if len(chunk) < want:
+                break
+    finally:
+        os.close(fd)
+    return b"".join(chunks).decode("utf-8")
+
+
+def list_tf_dir(directory: str) -> tuple[list[str], list[str]]:
+    """List one directory's .tf file paths and subdirectories (symlinks not followed)."""
+    tf_files: list[str] = []
+    subdirs: list[str] = []
+    with os.scandir(directory) as it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+            elif entry.name.endswith(".tf") and entry.is_file():
+                tf_files.append(entry.path)
+    return tf_files, subdirs
+
+
+def walk_tf_dirs(
+    root: str, list_dir: Callable[[str], tuple[_T, list[str]]]
+) -> Iterator[_T]:
+    """Walk the directories under root depth-first, yielding each one's listing.
+
+    list_dir returns a directory's listing and its subdirectories; callers can
+    pass a memoizing variant of list_tf_dir.
+    """
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            listing, subdirs = list_dir(directory)
+        except OSError:
+            # Missing or unreadable directories are skipped, as Path.rglob does
+            continue
+        yield listing
+        stack.extend(subdirs)
+
 
-import hcl2
-import lark
+def _iter_tf_files(root: str) -> Iterator[str]:
+    """Yield .tf file paths under root via os.scandir, without building Path objects."""
+    for tf_files in walk_tf_dirs(root, list_tf_dir):
+        yield from tf_files
 
 
 @dataclass
@@ -23,339 +186,436 @@ class TerraformEntity:
     position: dict[str, int] | None = None
 
 
+@dataclass(frozen=True)
+class _BlockSpec:
+    """How one top-level HCL block kind maps onto TerraformEntity fields."""
+
+    block: str  # key in the parsed HCL, also used as the entity category
+    id_prefix: str
+    typed: bool  # labelled "<type>" "<name>" rather than just "<name>"
+    provider_from: str | None  # "type" (type prefix), "name", or no provider
+    edge_type: str | None  # relationship type for references; None skips the scan
+
+
+# Block kinds in extraction order
+_BLOCK_SPECS = (
+    _BlockSpec("resource", "resource", True, "type", "depends_on"),
+    _BlockSpec("data", "data", True, "type", "depends_on"),
+    _BlockSpec("module", "module", False, None, "depends_on"),
+    _BlockSpec("variable", "var", False, None, None),
+    _BlockSpec("output", "output", False, None, "references"),
+    _BlockSpec("provider", "provider", False, "name", None),
+)
+
+# Relationships as parallel (source, target, type) columns
+Edges = tuple[list[str], list[str], list[str]]
+
+# Entities and relationships extracted from a single .tf file
+FileResult = tuple[dict[str, TerraformEntity], Edges]
+
+
+def _edge_dicts(edges: Edges) -> list[dict[str, str]]:
+    """Materialize relationship columns as the {source, target, type} dicts."""
+    return [
+        {"source": source, "target": target, "type": edge_type}
+        for source, target, edge_type in zip(*edges, strict=True)
+    ]
+
+
+def _encode_cache_entry(stamp: list[int], result: FileResult) -> dict[str, Any]:
+    """Build a JSON-serializable cache entry for one file's parse result."""
+    entities, edges = result
+    return {
+        "stamp": stamp,
+        "entities": [vars(e) for e in entities.values()],
+        # Stored column-wise, like the parser keeps them; no dict per edge
+        "edges": list(edges),
+    }
+
+
+def _decode_cache_entry(entry: dict[str, Any]) -> FileResult:
+    """Rebuild a file's parse result from its cache entry."""
+    entities = {e["id"]: TerraformEntity(**e) for e in entry["entities"]}
+    sources, targets, edge_types = entry["edges"]
+    columns = (sources, targets, edge_types)
+    if not all(isinstance(c, list) for c in columns) or not (
+        len(sources) == len(targets) == len(edge_types)
+    ):
+        raise TypeError("relationship columns must be lists of equal length")
+    return entities, columns
+
+
+def _intern_config(
+    config: dict[str, Any], interned: dict[int, dict[str, Any]]
+) -> dict[str, Any]:
+    """Return an earlier config equal to this one, so duplicate blocks share a dict.
+
+    Repos often repeat identical blocks (e.g. per-environment copies); sharing
+    them keeps memory flat until the output is serialized.
+    """
+    key = hash(
+        orjson.dumps(
+            config,
+            default=str,
+            option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS,
+        )
+    )
+    existing = interned.get(key)
+    # Compare on hit so a hash collision can never attach the wrong attributes
+    if existing is not None and existing == config:
+        return existing
+    interned.setdefault(key, config)
+    return config
+
+
 class TerraformParser:
     """Parses Terraform configuration files and extracts entities and relationships."""
 
-    def __init__(self, terraform_dir: str):
-        """Initialize parser with terraform directory path."""
+    def __init__(
+        self, terraform_dir: str, parallel: bool = True, use_cache: bool = True
+    ):
+        """Initialize parser with terraform directory path.
+
+        parallel=False keeps parsing in this process instead of starting a worker
+        pool. use_cache=False neither
+        reads nor writes the parse cache, for one-off directories such as uploads.
+        """
         self.terraform_dir = Path(terraform_dir)
+        self.parallel = parallel
+        self.use_cache = use_cache
         self.entities: dict[str, TerraformEntity] = {}
-        self.relationships: list[dict[str, str]] = []
+        # Same entities grouped by category (keyed by id) so layout needs no extra pass
+        self._by_category: defaultdict[str, dict[str, TerraformEntity]] = defaultdict(
+            dict
+        )
+        # Relationships are stored column-wise to avoid a dict per edge until output
+        self._rel_source: list[str] = []
+        self._rel_target: list[str] = []
+        self._rel_type: list[str] = []
+        # Dicts built so far from the columns, extended as edges are added
+        self._relationships: list[dict[str, str]] = []
+        cache_key = hashlib.blake2b(
+            os.path.abspath(terraform_dir).encode(), digest_size=16
+        ).hexdigest()
+        self._cache_path = CACHE_DIR / f"{cache_key}.json"
+
+    @property
+    def relationships(self) -> list[dict[str, str]]:
+        """Relationships as {source, target, type} dicts, each built only once."""
+        built = self._relationships
+        start = len(built)
+        if start < len(self._rel_source):
+            built.extend(
+                _edge_dicts(
+                    (
+                        self._rel_source[start:],
+                        self._rel_target[start:],
+                        self._rel_type[start:],
+                    )
+                )
+            )
+        return built
+
+    @property
+    def _edges(self) -> Edges:
+        """Relationship columns as a (sources, targets, types) tuple."""
+        return self._rel_source, self._rel_target, self._rel_type
 
     def parse_directory(self) -> dict[str, Any]:
         """Parse all .tf files in the directory and return entities and relationships."""
-        tf_files = list(self.terraform_dir.rglob("*.tf"))
+        root = str(self.terraform_dir)
+        tf_files = list(_iter_tf_files(root))
+
+        self.entities = {}
+        self._by_category.clear()
+        self._rel_source, self._rel_target, self._rel_type = [], [], []
+        self._relationships = []
+
+        # Reuse per-file results whose (mtime_ns, size) stamp is unchanged
+        cache = self._load_cache() if self.use_cache else {}
+        fresh_cache: dict[str, dict[str, Any]] = {}
+        results: dict[str, FileResult] = {}
+        stale: list[str] = []
+        stale_bytes = 0
+        stamps: dict[str, list[int]] = {}
 
         for tf_file in tf_files:
-            self._parse_file(tf_file)
+            st = os.stat(tf_file)
+            key = os.path.relpath(tf_file, root)
+            stamps[key] = [st.st_mtime_ns, st.st_size]
+            entry = cache.get(key)
+            if entry is not None:
+                try:
+                    if entry["stamp"] == stamps[key]:
+                        results[tf_file] = _decode_cache_entry(entry)
+                        fresh_cache[key] = entry
+                        continue
+                except (KeyError, TypeError, ValueError):
+                    # Malformed entries are reparsed and overwritten like stale ones
+                    pass
+            stale.append(tf_file)
+            stale_bytes += st.st_size
+
+        for tf_file, result in zip(
+            stale, self._parse_files(stale, stale_bytes), strict=True
+        ):
+            results[tf_file] = result
+            key = os.path.relpath(tf_file, root)
+            fresh_cache[key] = _encode_cache_entry(stamps[key], result)
+
+        # Merge in discovery order so output is independent of cache hits
+        interned: dict[int, dict[str, Any]] = {}
+        for tf_file in tf_files:
+            entities, (sources, targets, edge_types) = results[tf_file]
+            for entity in entities.values():
+                entity.attributes = _intern_config(entity.attributes, interned)
+                self._add_entity(entity)
+            self._rel_source.extend(sources)
+            self._rel_target.extend(targets)
+            self._rel_type.extend(edge_types)
+
+        # Rewrite only when files were reparsed or deleted files left stale entries
+        if self.use_cache and (stale or len(fresh_cache) != len(cache)):
+            self._save_cache(fresh_cache)
+
+        self.calculate_layout()
 
         return {
-            "entities": [asdict(e) for e in self.entities.values()],
+            # vars() is a shallow view; asdict() would deep-copy every attributes dict
+            "entities": [vars(e) for e in self.entities.values()],
             "relationships": self.relationships,
             "metadata": {
                 "total_files": len(tf_files),
                 "total_entities": len(self.entities),
-                "total_relationships": len(self.relationships),
+                "total_relationships": len(self._rel_source),
             },
         }
 
-    def _parse_file(self, file_path: Path) -> None:
-        """Parse a single Terraform file."""
+    def _parse_files(self, tf_files: list[str], total_bytes: int) -> list[FileResult]:
+        """Parse files independently, fanning out to processes when it pays off."""
+        workers = min(len(tf_files), os.cpu_count() or 1)
+        if not self.parallel or workers <= 1 or total_bytes < _PARALLEL_MIN_BYTES:
+            return [parse_file_worker(tf_file) for tf_file in tf_files]
+
+        # hcl2 parsing is CPU-bound pure Python that holds the GIL, so use processes.
+        # Callers may be request threads, and forking a threaded process can
+        # deadlock the children, so workers come from a fork server (or spawn).
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=_worker_context()
+        ) as executor:
+            return list(executor.map(parse_file_worker, tf_files, chunksize=4))
+
+    def _load_cache(self) -> dict[str, Any]:
+        """Load the per-file parse cache, treating any unreadable cache as empty."""
         try:
-            with open(file_path) as f:
-                content = f.read()
-
-            # Parse HCL content
-            parsed = hcl2.loads(content)
-
-            # Extract resources
-            if "resource" in parsed:
-                self._extract_resources(parsed["resource"])
-
-            # Extract data sources
-            if "data" in parsed:
-                self._extract_data_sources(parsed["data"])
+            cache = orjson.loads(self._cache_path.read_bytes())
+        except (OSError, orjson.JSONDecodeError):
+            return {}
+        # Results written by a different parser version are discarded wholesale
+        if not isinstance(cache, dict) or cache.get("version") != _cache_version():
+            return {}
+        files = cache.get("files")
+        return files if isinstance(files, dict) else {}
+
+    def _save_cache(self, cache: dict[str, dict[str, Any]]) -> None:
+        """Persist the per-file parse cache; an unwritable cache dir disables it."""
+        try:
+            self._cache_path.parent.mkdir(parents=True, exist_ok=True)
+            self._cache_path.write_bytes(
+                orjson.dumps(
+                    {"version": _cache_version(), "files": cache},
+                    default=str,
+                    option=orjson.OPT_NON_STR_KEYS,
+                )
+            )
+        except OSError:
+            pass
 
-            # Extract modules
-            if "module" in parsed:
-                self._extract_modules(parsed["module"])
+    def _parse_file(self, file_path: str | Path) -> None:
+        """Parse a single Terraform file."""
+        self.parse_text(_read_source(file_path), source=str(file_path))
 
-            # Extract variables
-            if "variable" in parsed:
-                self._extract_variables(parsed["variable"])
+    def parse_text(self, text: str, source: str = "<string>") -> None:
+        """Parse Terraform source held in memory, adding its entities to this parser."""
+        import lark
 
-            # Extract outputs
-            if "output" in parsed:
-                self._extract_outputs(parsed["output"])
+        try:
+            # Parse HCL content
+            parsed = _hcl_loads(text)
 
-            # Extract providers
-            if "provider" in parsed:
-                self._extract_providers(parsed["provider"])
+            for spec in _BLOCK_SPECS:
+                if spec.block in parsed:
+                    self._extract_block(spec, parsed[spec.block])
 
         except (lark.exceptions.LarkError, json.JSONDecodeError) as e:
-            print(f"Error parsing {file_path}: {e}")
-
-    def _extract_resources(self, resources: list[dict]) -> None:
-        """Extract resource entities from parsed HCL."""
-        for resource in resources:
-            for resource_type, instances in resource.items():
-                for name, config in instances.items():
-                    entity_id = f"resource.{resource_type}.{name}"
-
-                    # Extract provider from resource type
-                    provider = resource_type.split("_")[0]
-
-                    # Extract dependencies
+            print(f"Error parsing {source}: {e}")
+
+    def _extract_block(self, spec: _BlockSpec, blocks: list[dict]) -> None:
+        """Extract entities of one block kind (resource, data, module, ...)."""
+        for block in blocks:
+            if spec.typed:
+                # Labelled "<type>" "<name>", e.g. resource "aws_vpc" "main"
+                instances = [
+                    (type_name, name, config)
+                    for type_name, named in block.items()
+                    for name, config in named.items()
+                ]
+            else:
+                instances = [
+                    (spec.block, name, config) for name, config in block.items()
+                ]
+
+            for type_name, name, config in instances:
+                if spec.typed:
+                    entity_id = f"{spec.id_prefix}.{type_name}.{name}"
+                else:
+                    entity_id = f"{spec.id_prefix}.{name}"
+
+                if spec.provider_from == "type":
+                    provider: str | None = _provider_of(type_name)
+                elif spec.provider_from == "name":
+                    provider = name
+                else:
+                    provider = None
+
+                # Create relationships for blocks that can reference other entities
+                deps: set[str] = set()
+                if spec.edge_type is not None:
                     deps = self._extract_dependencies(config)
-
-                    entity = TerraformEntity(
-                        id=entity_id,
-                        type=resource_type,
-                        category="resource",
-                        name=name,
-                        provider=provider,
-                        attributes=config,
-                        dependencies=deps,
-                    )
-
-                    self.entities[entity_id] = entity
-
-                    # Create relationships
                     for dep in deps:
-                        self.relationships.append(
-                            {"source": entity_id, "target": dep, "type": "depends_on"}
-                        )
-
-    def _extract_data_sources(self, data_sources: list[dict]) -> None:
-        """Extract data source entities from parsed HCL."""
-        for data in data_sources:
-            for data_type, instances in data.items():
-                for name, config in instances.items():
-                    entity_id = f"data.{data_type}.{name}"
+                        self._rel_source.append(entity_id)
+                        self._rel_target.append(dep)
+                        self._rel_type.append(spec.edge_type)
 
-                    # Extract provider from data source type
-                    provider = data_type.split("_")[0]
-
-                    # Extract dependencies
-                    deps = self._extract_dependencies(config)
-
-                    entity = TerraformEntity(
+                self._add_entity(
+                    TerraformEntity(
                         id=entity_id,
-                        type=data_type,
-                        category="data",
+                        type=type_name,
+                        category=spec.block,
                         name=name,
                         provider=provider,
                         attributes=config,
-                        dependencies=deps,
+                        dependencies=list(deps),
                     )
-
-                    self.entities[entity_id] = entity
-
-                    # Create relationships
-                    for dep in deps:
-                        self.relationships.append(
-                            {"source": entity_id, "target": dep, "type": "depends_on"}
-                        )
-
-    def _extract_modules(self, modules: list[dict]) -> None:
-        """Extract module entities from parsed HCL."""
-        for module in modules:
-            for name, config in module.items():
-                entity_id = f"module.{name}"
-
-                # Extract dependencies
-                deps = self._extract_dependencies(config)
-
-                entity = TerraformEntity(
-                    id=entity_id,
-                    type="module",
-                    category="module",
-                    name=name,
-                    provider=None,
-                    attributes=config,
-                    dependencies=deps,
                 )
 
-                self.entities[entity_id] = entity
-
-                # Create relationships
-                for dep in deps:
-                    self.relationships.append(
-                        {"source": entity_id, "target": dep, "type": "depends_on"}
-                    )
-
-    def _extract_variables(self, variables: list[dict]) -> None:
-        """Extract variable entities from parsed HCL."""
-        for var in variables:
-            for name, config in var.items():
-                entity_id = f"var.{name}"
-
-                entity = TerraformEntity(
-                    id=entity_id,
-                    type="variable",
-                    category="variable",
-                    name=name,
-                    provider=None,
-                    attributes=config,
-                    dependencies=[],
-                )
-
-                self.entities[entity_id] = entity
-
-    def _extract_outputs(self, outputs: list[dict]) -> None:
-        """Extract output entities from parsed HCL."""
-        for output in outputs:
-            for name, config in output.items():
-                entity_id = f"output.{name}"
-
-                # Extract dependencies from value references
-                deps = self._extract_dependencies(config)
-
-                entity = TerraformEntity(
-                    id=entity_id,
-                    type="output",
-                    category="output",
-                    name=name,
-                    provider=None,
-                    attributes=config,
-                    dependencies=deps,
-                )
-
-                self.entities[entity_id] = entity
-
-                # Create relationships
-                for dep in deps:
-                    self.relationships.append(
-                        {"source": entity_id, "target": dep, "type": "references"}
-                    )
-
-    def _extract_providers(self, providers: list[dict]) -> None:
-        """Extract provider entities from parsed HCL."""
-        for provider in providers:
-            for name, config in provider.items():
-                entity_id = f"provider.{name}"
-
-                entity = TerraformEntity(
-                    id=entity_id,
-                    type="provider",
-                    category="provider",
-                    name=name,
-                    provider=name,
-                    attributes=config,
-                    dependencies=[],
-                )
-
-                self.entities[entity_id] = entity
-
-    def _extract_dependencies(self, config: dict[str, Any]) -> list[str]:
+    def _extract_dependencies(self, config: dict[str, Any]) -> set[str]:
         """Extract dependencies from configuration references."""
-        deps = []
-
-        # Check explicit depends_on
-        if "depends_on" in config:
-            for dep in config["depends_on"]:
-                if isinstance(dep, str):
-                    deps.append(dep)
-
-        # Parse references in string values (simplified)
-        for _key, value in config.items():
-            if isinstance(value, str):
-                # Look for terraform references like ${resource.type.name}
-                refs = self._find_references(value)
-                deps.extend(refs)
-            elif isinstance(value, dict):
-                # Recursively check nested dictionaries
-                nested_deps = self._extract_dependencies(value)
-                deps.extend(nested_deps)
-            elif isinstance(value, list):
-                # Check items in lists
-                for item in value:
-                    if isinstance(item, str):
-                        refs = self._find_references(item)
-                        deps.extend(refs)
-                    elif isinstance(item, dict):
-                        nested_deps = self._extract_dependencies(item)
-                        deps.extend(nested_deps)
-
-        return list(set(deps))  # Remove duplicates
-
-    def _find_references(self, text: str) -> list[str]:
-        """Find Terraform references in text."""
-        import re
-
-        refs = []
-
-        # Handle ${} syntax and regular references
-        text = text.replace("${", "").replace("}", "")
-
-        # Match patterns for Terraform references
-        patterns = [
-            # AWS resources without explicit 'resource' prefix
-            (r"(aws_\w+)\.(\w+)", "resource"),
-            (r"(azurerm_\w+)\.(\w+)", "resource"),
-            (r"(google_\w+)\.(\w+)", "resource"),
-            # Explicit resource references
-            (r"resource\.(\w+)\.(\w+)", "resource"),
-            # Data sources
-            (r"data\.(\w+)\.(\w+)", "data"),
-            # Modules
-            (r"module\.(\w+)", "module"),
-            # Variables
-            (r"var\.(\w+)", "var"),
-            # Locals
-            (r"local\.(\w+)", "local"),
-            # Outputs
-            (r"output\.(\w+)", "output"),
-        ]
-
-        for pattern, prefix_type in patterns:
-            matches = re.findall(pattern, text)
-            for match in matches:
-                if isinstance(match, tuple) and len(match) == 2:
-                    # Two-part reference (resource/data)
-                    if prefix_type == "resource" and not pattern.startswith(
-                        r"resource"
-                    ):
-                        # AWS/Azure/Google resource without 'resource' prefix
-                        refs.append(f"resource.{match[0]}.{match[1]}")
-                    else:
-                        refs.append(f"{prefix_type}.{match[0]}.{match[1]}")
-                elif isinstance(match, str):
-                    # Single-part reference (module/var/local/output)
-                    refs.append(f"{prefix_type}.{match}")
-
-        return list(set(refs))  # Remove duplicates
+        deps: set[str] = set()
+        strings: list[str] = []
+
+        # Walk nested blocks with an explicit stack instead of recursing per dict
+        stack: list[dict | list] = [config]
+        while stack:
+            node = stack.pop()
+
+            if isinstance(node, dict):
+                # Check explicit depends_on
+                for dep in node.get("depends_on", ()):
+                    if isinstance(dep, str):
+                        deps.add(dep)
+
+            for value in node.values() if isinstance(node, dict) else node:
+                if isinstance(value, str):
+                    strings.append(value)
+                elif isinstance(value, dict | list):
+                    stack.append(value)
+
+        # Scan every string value in one regex pass. The \x1f separator is not a
+        # word character, so no reference can span two values.
+        self._find_references("\x1f".join(strings), deps)
+
+        return deps
+
+    def _find_references(self, text: str, refs: set[str] | None = None) -> set[str]:
+        """Find Terraform references in text, adding them to refs when given."""
+        if refs is None:
+            refs = set()
+
+        # One pass over the text; the pattern matches inside ${...} interpolations as-is
+        for match in _REF_RE.finditer(text):
+            kind = match.lastgroup
+            assert kind is not None
+            refs.add(f"{_REF_PREFIXES[kind]}.{match.group(kind)}")
+
+        return refs
+
+    def _add_entity(self, entity: TerraformEntity) -> None:
+        """Register an entity, replacing any earlier one with the same id."""
+        self.entities[entity.id] = entity
+        self._by_category[entity.category][entity.id] = entity
 
     def calculate_layout(self) -> None:
         """Calculate positions for entities for visualization."""
-        # Simple grid layout
-        categories: dict[str, list[TerraformEntity]] = {}
-        for entity in self.entities.values():
-            if entity.category not in categories:
-                categories[entity.category] = []
-            categories[entity.category].append(entity)
-
+        # Simple grid layout: one column per category, in first-seen order
         x_offset = 0
-        for _category, entities in categories.items():
+        for entities in self._by_category.values():
             y_offset = 0
-            for entity in entities:
+            for entity in entities.values():
                 entity.position = {"x": x_offset * 250, "y": y_offset * 150}
                 y_offset += 1
             x_offset += 1
 
-    def save_to_json(self, output_path: str) -> None:
-        """Save parsed entities and relationships to JSON file."""
-        self.calculate_layout()
+    def save_to_json(
+        self, output_path: str, result: dict[str, Any] | None = None
+    ) -> None:
+        """Save parsed entities and relationships to JSON file.
 
-        result = self.parse_directory()
+        Pass the result of an earlier parse_directory() call to avoid parsing twice.
+        """
+        if result is None:
+            result = self.parse_directory()
 
         # Ensure output directory exists
         output_file = Path(output_path)
         output_file.parent.mkdir(parents=True, exist_ok=True)
 
-        with open(output_file, "w") as f:
-            json.dump(result, f, indent=2, default=str)
+        with open(output_file, "wb") as f:
+            _write_json_streaming(f, result)
 
         print(f"Terraform entities saved to {output_path}")
 
 
+def _write_json_streaming(f: BinaryIO, result: dict[str, Any]) -> None:
+    """Write a JSON object, serializing list values one element per line.
+
+    Only one element is encoded at a time, so peak memory stays at the live
+    entities rather than a second, fully serialized copy of the whole graph.
+    """
+    f.write(b"{")
+    for i, (key, value) in enumerate(result.items()):
+        if i:
+            f.write(b",\n")
+        f.write(orjson.dumps(key) + b":")
+        if isinstance(value, list):
+            f.write(b"[")
+            for j, item in enumerate(value):
+                f.write(b",\n" if j else b"\n")
+                f.write(orjson.dumps(item, default=str, option=orjson.OPT_NON_STR_KEYS))
+            f.write(b"\n]" if value else b"]")
+        else:
+            f.write(orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS))
+    f.write(b"}\n")
+
+
+def parse_file_worker(path: str) -> FileResult:
+    """Parse a single Terraform file in isolation, returning entities and relationships.
+
+    Defined at module level so it can be pickled into ProcessPoolExecutor workers.
+    """
+    parser = TerraformParser(os.path.dirname(path))
+    parser._parse_file(path)
+    return parser.entities, parser._edges
+
+
 def parse_terraform(
     terraform_dir: str, output_path: str = "work/build/tf_entities.json"
 ) -> dict[str, Any]:
     """Main function to parse Terraform configuration."""
     parser = TerraformParser(terraform_dir)
-    parser.save_to_json(output_path)
-    return parser.parse_directory()
+    result = parser.parse_directory()
+    parser.save_to_json(output_path, result=result)
+    return result
 
 
 if __name__ == "__main__":
@@ -0,0 +1,19 @@
+"""Shared pytest configuration."""
+
+import os
+
+import pytest
+
+from backend import parser as backend_parser
+
+# Don't probe for a frontend build while testing the API
+os.environ.setdefault("TF_VISUALIZER_SKIP_FRONTEND", "1")
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _parse_cache_dir(tmp_path_factory):
+    """Keep parse caches out of the working tree for the whole session."""
+    cache_dir = tmp_path_factory.mktemp("tf-parse-cache")
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(backend_parser, "CACHE_DIR", cache_dir)
+        yield cache_dir
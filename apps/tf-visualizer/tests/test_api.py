@@ -1,27 +1,54 @@
 """Tests for Flask API module."""
 
-import json
 import os
-import sys
+import shutil
+import time
 from io import BytesIO
-from unittest.mock import MagicMock, patch
+from pathlib import Path
+from unittest.mock import patch
 
+import orjson
 import pytest
 
-# Add parent directory to path
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend import api as backend_api
+from backend import parser as backend_parser
+from backend.api import app, parse_terraform
+from backend.parser import TerraformParser
 
-from backend.api import app, parse_terraform  # noqa: E402
+_TF_BYTES = b'resource "aws_instance" "test" {\n  ami = "ami-123"\n}\n'
+
+
+def _make_exists(*present):
+    """Build an os.path.exists stand-in that is true only for paths containing a marker."""
+
+    def exists(path):
+        return any(marker in path for marker in present)
+
+    return exists
+
+
+@pytest.fixture(autouse=True)
+def _reset_entities_response():
+    """Drop the encoded /api/entities body so no test sees another's cache."""
+    backend_api._entities_response = None
+    yield
+    backend_api._entities_response = None
+
+
+@pytest.fixture(scope="session")
+def _app():
+    """Configure the Flask app once for the whole session."""
+    app.config["TESTING"] = True
+    return app
 
 
 class TestFlaskAPI:
     """Test suite for Flask API endpoints."""
 
-    @pytest.fixture
-    def client(self):
-        """Create test client."""
-        app.config["TESTING"] = True
-        with app.test_client() as client:
+    @pytest.fixture(scope="module")
+    def client(self, _app):
+        """Create test client shared across the module."""
+        with _app.test_client() as client:
             yield client
 
     def test_health_check(self, client):
@@ -29,7 +56,7 @@ class TestFlaskAPI:
         response = client.get("/health")
         assert response.status_code == 200
 
-        data = json.loads(response.data)
+        data = response.get_json()
         assert data["status"] == "healthy"
         assert data["service"] == "tf-visualizer"
         assert "version" in data
@@ -39,7 +66,7 @@ class TestFlaskAPI:
         response = client.get("/api/sample")
         assert response.status_code == 200
 
-        data = json.loads(response.data)
+        data = response.get_json()
         assert data["success"] is True
         assert "data" in data
 
@@ -52,12 +79,16 @@ class TestFlaskAPI:
         assert len(sample_data["entities"]) > 0
         assert len(sample_data["relationships"]) > 0
 
+        # The body is encoded once and served as-is on every request
+        assert response.mimetype == "application/json"
+        assert client.get("/api/sample").data == response.data
+
     def test_parse_directory_missing_data(self, client):
         """Test parse directory with missing data."""
         response = client.post("/api/parse-directory", json={})
         assert response.status_code == 400
 
-        data = json.loads(response.data)
+        data = response.get_json()
         assert "error" in data
 
     def test_parse_directory_invalid_path(self, client):
@@ -65,7 +96,7 @@ class TestFlaskAPI:
         response = client.post("/api/parse-directory", json={"directory": "/nonexistent/path"})
         assert response.status_code == 404
 
-        data = json.loads(response.data)
+        data = response.get_json()
         assert "error" in data
 
     def test_parse_files_no_files(self, client):
@@ -73,33 +104,70 @@ class TestFlaskAPI:
         response = client.post("/api/parse")
         assert response.status_code == 400
 
-        data = json.loads(response.data)
+        data = response.get_json()
         assert "error" in data
         assert "No files provided" in data["error"]
 
-    def test_frontend_fallback(self, client):
+    @pytest.mark.parametrize("skip", [True, False])
+    def test_frontend_fallback(self, client, monkeypatch, skip):
         """Test frontend fallback behavior."""
-        from pathlib import Path
+        if skip:
+            monkeypatch.setenv("TF_VISUALIZER_SKIP_FRONTEND", "1")
+        else:
+            monkeypatch.delenv("TF_VISUALIZER_SKIP_FRONTEND", raising=False)
 
         response = client.get("/")
 
-        # Check if frontend build exists
-        frontend_build = Path(__file__).parent.parent / "frontend" / "build" / "index.html"
-
-        if frontend_build.exists():
+        if skip:
+            # Frontend serving disabled, API answers with a JSON error
+            assert response.status_code == 404
+            assert response.get_json()["error"] == "Frontend not configured"
+        elif (Path(app.static_folder or "") / "index.html").exists():
             # When frontend exists, it should serve the index.html
             assert response.status_code == 200
-            # The actual index.html content would be returned
         else:
-            # When frontend build doesn't exist, API returns 404 with error message
+            # When frontend build doesn't exist, the static lookup 404s
             assert response.status_code == 404
-            # Check if response is JSON before trying to parse
-            if response.content_type and "application/json" in response.content_type:
-                data = json.loads(response.data)
-                assert data["error"] == "Frontend not configured"
-            else:
-                # If not JSON, just check the status code
-                assert b"error" in response.data or b"404" in response.data
+
+    @pytest.mark.parametrize(
+        ("name", "max_age"),
+        [("bundle.0123456789abcdef0123.js", 365 * 24 * 60 * 60), ("index.html", 0)],
+    )
+    def test_frontend_asset_caching(self, client, monkeypatch, tmp_path, name, max_age):
+        """Test hashed bundles are cacheable and every asset revalidates via ETag."""
+        monkeypatch.delenv("TF_VISUALIZER_SKIP_FRONTEND", raising=False)
+        monkeypatch.setattr(app, "static_folder", str(tmp_path))
+        (tmp_path / name).write_text("console.log('app');\n")
+
+        response = client.get(f"/{name}")
+        assert response.status_code == 200
+        assert response.cache_control.max_age == max_age
+        etag = response.headers["ETag"]
+        response.close()
+
+        # Revalidation with the same ETag is answered without a body
+        response = client.get(f"/{name}", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.data == b""
+        response.close()
+
+    @pytest.mark.parametrize(
+        ("path", "expected"),
+        [("bundle.js", b"bundle"), ("dashboard/settings", b"index"), ("", b"index")],
+    )
+    def test_serve_frontend_falls_back_to_index(self, monkeypatch, tmp_path, path, expected):
+        """Test existing assets are served and unknown paths get the SPA index."""
+        monkeypatch.delenv("TF_VISUALIZER_SKIP_FRONTEND", raising=False)
+        monkeypatch.setattr(app, "static_folder", str(tmp_path))
+        (tmp_path / "index.html").write_bytes(b"index")
+        (tmp_path / "bundle.js").write_bytes(b"bundle")
+
+        with app.test_request_context(f"/{path}"):
+            response = backend_api.serve_frontend(path)
+            response.direct_passthrough = False
+            assert response.status_code == 200
+            assert response.get_data() == expected
+            response.close()
 
     def test_parse_terraform_function(self, tmp_path):
         """Test the parse_terraform helper function."""
@@ -107,7 +175,7 @@ class TestFlaskAPI:
         test_dir = tmp_path / "test_terraform"
         test_dir.mkdir()
         test_file = test_dir / "main.tf"
-        test_file.write_text('resource "aws_instance" "test" {\n  ami = "ami-123"\n}')
+        test_file.write_bytes(_TF_BYTES)
 
         output_file = tmp_path / "output.json"
 
@@ -117,25 +185,56 @@ class TestFlaskAPI:
         assert "relationships" in result
         assert output_file.exists()
 
+    def test_parse_terraform_parses_directory_once(self, tmp_path):
+        """Test parse_terraform reuses its parse result when saving."""
+        test_file = tmp_path / "main.tf"
+        test_file.write_bytes(_TF_BYTES)
+
+        original = TerraformParser.parse_directory
+        calls = []
+
+        def counting_parse(self):
+            calls.append(self)
+            return original(self)
+
+        with patch.object(TerraformParser, "parse_directory", counting_parse):
+            parse_terraform(str(tmp_path), str(tmp_path / "output.json"))
+
+        assert len(calls) == 1
+
+    def test_parse_files_leaves_no_parse_cache(self, client, tmp_path, monkeypatch):
+        """Test parsing an upload neither writes nor keeps a parse cache file."""
+        cache_dir = tmp_path / "cache"
+        monkeypatch.setattr(backend_parser, "CACHE_DIR", cache_dir)
+        monkeypatch.chdir(tmp_path)
+        data = {"files": [(BytesIO(_TF_BYTES), "main.tf")]}
+
+        response = client.post("/api/parse", data=data, content_type="multipart/form-data")
+        assert response.status_code == 200
+        assert response.get_json()["data"]["metadata"]["total_entities"] == 1
+        assert not cache_dir.exists() or not any(cache_dir.iterdir())
+
     def test_parse_files_with_uploaded_files(self, client, tmp_path):
         """Test parse files with actual uploaded files."""
         # Create test files using proper multipart format
-        data = {}
-        data["files"] = [
-            (BytesIO(b'resource "aws_instance" "test" { ami = "ami-123" }'), "main.tf")
-        ]
+        data = {"files": [(BytesIO(_TF_BYTES), "main.tf")]}
 
-        with patch("backend.api.parse_terraform") as mock_parse:
+        with patch.object(backend_api, "parse_terraform") as mock_parse:
             mock_parse.return_value = {"entities": [], "relationships": []}
 
             response = client.post("/api/parse", data=data, content_type="multipart/form-data")
             assert response.status_code == 200
 
-            result = json.loads(response.data)
+            result = response.get_json()
             assert result["success"] is True
             assert "data" in result
             mock_parse.assert_called_once()
 
+            # Uploads land in a per-request directory that is removed afterwards
+            upload_dir = Path(mock_parse.call_args.args[0])
+            assert upload_dir.name.startswith("tfparse_")
+            assert not upload_dir.exists()
+
     def test_parse_files_with_empty_file_list(self, client):
         """Test parse files with empty file list."""
         # Send request with files parameter but empty list
@@ -143,280 +242,392 @@ class TestFlaskAPI:
         response = client.post("/api/parse", data=data)
         assert response.status_code == 400
 
-        result = json.loads(response.data)
+        result = response.get_json()
         assert "error" in result
 
+    def test_parse_files_skips_non_tf_uploads(self, client):
+        """Test non-.tf uploads are skipped and only .tf files are saved."""
+        data = {
+            "files": [
+                (BytesIO(_TF_BYTES), "main.tf"),
+                (BytesIO(b'region = "us-east-1"\n'), "prod.tfvars"),
+            ]
+        }
+        saved: list[str] = []
+
+        def record(directory, output_path, **kwargs):
+            saved.extend(p.name for p in Path(directory).iterdir())
+            return {"entities": [], "relationships": []}
+
+        with patch.object(backend_api, "parse_terraform", side_effect=record):
+            response = client.post("/api/parse", data=data, content_type="multipart/form-data")
+            assert response.status_code == 200
+            assert saved == ["main.tf"]
+
+    def test_parse_files_without_tf_uploads(self, client):
+        """Test a selection with no .tf files is refused before anything is parsed."""
+        data = {"files": [(BytesIO(b"{}"), "notes.json")]}
+
+        with patch.object(backend_api, "parse_terraform") as mock_parse:
+            response = client.post("/api/parse", data=data, content_type="multipart/form-data")
+            assert response.status_code == 400
+            assert "No .tf files" in response.get_json()["error"]
+            mock_parse.assert_not_called()
+
     def test_parse_files_with_exception(self, client):
         """Test parse files when exception occurs."""
-        data = {}
-        data["files"] = [
-            (BytesIO(b'resource "aws_instance" "test" { ami = "ami-123" }'), "main.tf")
-        ]
+        data = {"files": [(BytesIO(_TF_BYTES), "main.tf")]}
 
-        with patch("backend.api.parse_terraform") as mock_parse:
+        with patch.object(backend_api, "parse_terraform") as mock_parse:
             mock_parse.side_effect = Exception("Parse error")
 
             response = client.post("/api/parse", data=data, content_type="multipart/form-data")
             assert response.status_code == 500
 
-            result = json.loads(response.data)
+            result = response.get_json()
             assert result["success"] is False
             assert "error" in result
             assert "Parse error" in result["error"]
 
-    def test_parse_directory_with_path_mappings(self, client):
+    @pytest.mark.parametrize(
+        ("directory", "expected_dir"),
+        [
+            # Known alias
+            ("terraform", "/app/project/terraform"),
+            # project/ prefix
+            ("project/some/path", "/app/project/some/path"),
+        ],
+    )
+    def test_parse_directory_with_path_mappings(self, client, directory, expected_dir):
         """Test parse directory with various path mappings."""
-        # Test with known alias
-        with patch("backend.api.os.path.exists") as mock_exists:
-            mock_exists.return_value = True
-            with patch("backend.api.parse_terraform") as mock_parse:
-                mock_parse.return_value = {"entities": [], "relationships": []}
-
-                # Test with known alias "terraform"
-                response = client.post("/api/parse-directory", json={"directory": "terraform"})
-                assert response.status_code == 200
-                mock_parse.assert_called_with(
-                    "/app/project/terraform", "work/build/tf_entities.json"
-                )
-
-                # Test with project/ prefix
-                response = client.post(
-                    "/api/parse-directory", json={"directory": "project/some/path"}
-                )
-                assert response.status_code == 200
-                mock_parse.assert_called_with(
-                    "/app/project/some/path", "work/build/tf_entities.json"
-                )
+        with (
+            patch.object(backend_api.os.path, "exists", return_value=True),
+            patch.object(
+                backend_api,
+                "parse_terraform",
+                return_value={"entities": [], "relationships": []},
+            ) as mock_parse,
+        ):
+            response = client.post("/api/parse-directory", json={"directory": directory})
+            assert response.status_code == 200
+            mock_parse.assert_called_once_with(expected_dir, "work/build/tf_entities.json")
 
     def test_parse_directory_with_exception(self, client):
         """Test parse directory when exception occurs."""
-        with patch("backend.api.os.path.exists") as mock_exists:
-            mock_exists.return_value = True
-            with patch("backend.api.parse_terraform") as mock_parse:
-                mock_parse.side_effect = Exception("Directory parse error")
-
-                response = client.post("/api/parse-directory", json={"directory": "/some/path"})
-                assert response.status_code == 500
+        with (
+            patch.object(backend_api.os.path, "exists", return_value=True),
+            patch.object(
+                backend_api, "parse_terraform", side_effect=Exception("Directory parse error")
+            ),
+        ):
+            response = client.post("/api/parse-directory", json={"directory": "/some/path"})
+            assert response.status_code == 500
 
-                data = json.loads(response.data)
+            data = response.get_json()
+            assert data["success"] is False
+            assert "error" in data
+            assert "Directory parse error" in data["error"]
+
+    @pytest.mark.parametrize("error", [None, Exception("Directory parse error")])
+    def test_parse_directory_async(self, client, tmp_path, error):
+        """Test a background directory parse is reported through its job id."""
+        with (
+            patch.object(backend_api, "_PARSE_JOBS_DIR", tmp_path),
+            patch.object(backend_api.os.path, "exists", return_value=True),
+            patch.object(
+                backend_api,
+                "parse_terraform",
+                return_value={"entities": ["test"]},
+                side_effect=error,
+            ) as mock_parse,
+        ):
+            response = client.post(
+                "/api/parse-directory", json={"directory": "/some/path", "async": True}
+            )
+            assert response.status_code == 202
+            job_id = response.get_json()["job_id"]
+
+            # Poll until the background worker records the outcome
+            deadline = time.monotonic() + 5
+            while True:
+                response = client.get(f"/api/parse-status/{job_id}")
+                assert response.status_code == 200
+                data = response.get_json()
+                if data["status"] != "running" or time.monotonic() > deadline:
+                    break
+                time.sleep(0.01)
+
+            # Background jobs parse in-process rather than forking from a thread
+            mock_parse.assert_called_once_with(
+                "/some/path", "work/build/tf_entities.json", parallel=False
+            )
+
+            if error is None:
+                assert data["status"] == "done"
+                assert data["data"] == {"entities": ["test"]}
+                assert data["source"] == "/some/path"
+            else:
+                assert data["status"] == "failed"
                 assert data["success"] is False
-                assert "error" in data
                 assert "Directory parse error" in data["error"]
 
+            # The status lives on disk, so repeated polls (from any worker) agree
+            assert client.get(f"/api/parse-status/{job_id}").get_json() == data
+
+            # Expired jobs are no longer reported
+            expired = time.time() - backend_api._PARSE_JOB_TTL - 1
+            os.utime(tmp_path / f"{job_id}.json", (expired, expired))
+            assert client.get(f"/api/parse-status/{job_id}").status_code == 404
+
+    @pytest.mark.parametrize("job_id", ["0" * 32, "../../etc/passwd", "not-a-job"])
+    def test_parse_status_unknown_job(self, client, tmp_path, job_id):
+        """Test unknown or malformed job ids are answered with 404."""
+        with patch.object(backend_api, "_PARSE_JOBS_DIR", tmp_path):
+            response = client.get(f"/api/parse-status/{job_id}")
+            assert response.status_code == 404
+
     def test_get_entities_no_cache(self, client):
         """Test get entities when no cache exists."""
-        with patch("backend.api.os.path.exists") as mock_exists:
+        with (
             # First call for entities_file check
-            mock_exists.side_effect = [False, True, False, False]
-
-            with patch("backend.api.parse_terraform") as mock_parse:
-                mock_parse.return_value = {"entities": ["test"], "relationships": []}
-
-                with patch.dict(os.environ, {"TF_SCAN_PATHS": "/app/project/terraform"}):
-                    response = client.get("/api/entities")
-                    assert response.status_code == 200
+            patch.object(backend_api.os.path, "exists", side_effect=[False, True, False, False]),
+            patch.object(
+                backend_api,
+                "parse_terraform",
+                return_value={"entities": ["test"], "relationships": []},
+            ),
+            patch.object(backend_api, "_ENTITY_SCAN_PATHS", ("/app/project/terraform",)),
+        ):
+            response = client.get("/api/entities")
+            assert response.status_code == 200
 
-                    data = json.loads(response.data)
-                    assert data["success"] is True
-                    assert "data" in data
-                    assert "source" in data
+            data = response.get_json()
+            assert data["success"] is True
+            assert "data" in data
+            assert "source" in data
 
     def test_get_entities_fallback_to_test_data(self, client):
         """Test get entities fallback to test data."""
-        with patch("backend.api.os.path.exists") as mock_exists:
+        with (
             # Simulate: no cache, scan paths don't exist, but test-terraform exists
-            def exists_side_effect(path):
-                if "tf_entities.json" in path:
-                    return False
-                if "/app/project/terraform" in path or "/app/project/helm" in path:
-                    return False
-                if "/app/test-terraform" in path:
-                    return True
-                return False
-
-            mock_exists.side_effect = exists_side_effect
-
-            with patch("backend.api.parse_terraform") as mock_parse:
-                mock_parse.return_value = {"entities": ["test"], "relationships": []}
-
-                response = client.get("/api/entities")
-                assert response.status_code == 200
+            patch.object(
+                backend_api.os.path, "exists", side_effect=_make_exists("/app/test-terraform")
+            ),
+            patch.object(
+                backend_api,
+                "parse_terraform",
+                return_value={"entities": ["test"], "relationships": []},
+            ),
+        ):
+            response = client.get("/api/entities")
+            assert response.status_code == 200
 
-                data = json.loads(response.data)
-                assert data["success"] is True
-                assert data["source"] == "test-data"
+            data = response.get_json()
+            assert data["success"] is True
+            assert data["source"] == "test-data"
 
     def test_get_entities_fallback_to_local_terraform(self, client):
         """Test get entities fallback to local terraform directory."""
-        with patch("backend.api.os.path.exists") as mock_exists:
+        with (
             # Simulate: no cache, no project paths, no test data, but local terraform exists
-            mock_exists.side_effect = [False, False, False, True]
-
-            with patch("backend.api.parse_terraform") as mock_parse:
-                mock_parse.return_value = {"entities": ["local"], "relationships": []}
-
-                response = client.get("/api/entities")
-                assert response.status_code == 200
+            patch.object(backend_api.os.path, "exists", side_effect=[False, False, False, True]),
+            patch.object(
+                backend_api,
+                "parse_terraform",
+                return_value={"entities": ["local"], "relationships": []},
+            ),
+        ):
+            response = client.get("/api/entities")
+            assert response.status_code == 200
 
-                data = json.loads(response.data)
-                assert data["success"] is True
+            data = response.get_json()
+            assert data["success"] is True
 
     def test_get_entities_no_terraform_found(self, client):
         """Test get entities when no terraform files found."""
-        with patch("backend.api.os.path.exists") as mock_exists:
-            # Everything returns False
-            mock_exists.return_value = False
-
+        # Everything returns False
+        with patch.object(backend_api.os.path, "exists", return_value=False):
             response = client.get("/api/entities")
             assert response.status_code == 404
 
-            data = json.loads(response.data)
+            data = response.get_json()
             assert data["success"] is False
             assert "No terraform files found" in data["error"]
 
     def test_get_entities_parse_exception(self, client):
         """Test get entities when parsing fails."""
-        with patch("backend.api.os.path.exists") as mock_exists:
-
-            def exists_side_effect(path):
-                if "tf_entities.json" in path:
-                    return False
-                if "/app/project" in path or "/app/test-terraform" in path:
-                    return False
-                if "./terraform" in path:
-                    return True
-                return False
-
-            mock_exists.side_effect = exists_side_effect
-
-            with patch("backend.api.parse_terraform") as mock_parse:
-                mock_parse.side_effect = Exception("Parse failed")
-
-                response = client.get("/api/entities")
-                assert response.status_code == 500
+        with (
+            patch.object(backend_api.os.path, "exists", side_effect=_make_exists("./terraform")),
+            patch.object(backend_api, "parse_terraform", side_effect=Exception("Parse failed")),
+        ):
+            response = client.get("/api/entities")
+            assert response.status_code == 500
 
-                data = json.loads(response.data)
-                assert data["success"] is False
-                assert "Failed to parse terraform directory" in data["error"]
+            data = response.get_json()
+            assert data["success"] is False
+            assert "Failed to parse terraform directory" in data["error"]
 
-    def test_get_entities_with_cache(self, client, tmp_path):
+    def test_get_entities_with_cache(self, client, tmp_path, monkeypatch):
         """Test get entities when cache exists."""
-        # Create cache file
+        # Create cache file where the API expects it, relative to the working directory
         cache_data = {"entities": ["cached"], "relationships": []}
-        cache_file = tmp_path / "tf_entities.json"
-        cache_file.write_text(json.dumps(cache_data))
+        cache_file = tmp_path / "work" / "build" / "tf_entities.json"
+        cache_file.parent.mkdir(parents=True)
+        cache_file.write_bytes(orjson.dumps(cache_data))
+        monkeypatch.chdir(tmp_path)
 
-        with patch("backend.api.os.path.exists") as mock_exists:
-            mock_exists.return_value = True
+        response = client.get("/api/entities")
+        assert response.status_code == 200
 
-            with patch("builtins.open") as mock_open:
-                # Need to actually open the file we created
-                mock_open.return_value.__enter__.return_value.read.return_value = json.dumps(
-                    cache_data
-                )
+        data = response.get_json()
+        assert data["success"] is True
+        assert data["data"] == cache_data
 
-                response = client.get("/api/entities")
-                assert response.status_code == 200
+    def test_get_entities_cache_reused_until_file_changes(self, client, tmp_path, monkeypatch):
+        """Test the entities file is only re-read after it changes on disk."""
+        cache_file = tmp_path / "work" / "build" / "tf_entities.json"
+        cache_file.parent.mkdir(parents=True)
+        cache_file.write_bytes(orjson.dumps({"entities": ["first"], "relationships": []}))
+        monkeypatch.chdir(tmp_path)
 
-                data = json.loads(response.data)
-                assert data["success"] is True
-                assert data["data"]["entities"][0] == "cached"
+        assert client.get("/api/entities").get_json()["data"]["entities"] == ["first"]
 
-    def test_get_entities_cache_read_error(self, client):
-        """Test get entities when cache read fails."""
-        with patch("backend.api.os.path.exists") as mock_exists:
-            mock_exists.return_value = True
+        # Unchanged file: served from memory without reopening it
+        with patch("builtins.open", side_effect=AssertionError("cache file reopened")):
+            response = client.get("/api/entities")
+        assert response.get_json()["data"]["entities"] == ["first"]
 
-            with patch("builtins.open") as mock_open:
-                mock_open.side_effect = Exception("Read error")
+        cache_file.write_bytes(orjson.dumps({"entities": ["second"], "relationships": []}))
+        assert client.get("/api/entities").get_json()["data"]["entities"] == ["second"]
 
-                response = client.get("/api/entities")
-                assert response.status_code == 500
+    def test_get_entities_cache_read_error(self, client, tmp_path, monkeypatch):
+        """Test get entities when cache read fails."""
+        # A real entities file, so the stat succeeds and the read is what fails
+        monkeypatch.chdir(tmp_path)
+        entities_file = tmp_path / "work" / "build" / "tf_entities.json"
+        entities_file.parent.mkdir(parents=True)
+        entities_file.write_bytes(b'{"entities": [], "relationships": []}')
 
-                data = json.loads(response.data)
-                assert data["success"] is False
-                assert "Failed to load entities" in data["error"]
+        with patch("builtins.open", side_effect=Exception("Read error")) as mock_open:
+            response = client.get("/api/entities")
+            assert response.status_code == 500
+            mock_open.assert_called_once_with("work/build/tf_entities.json", "rb")
+
+            data = response.get_json()
+            assert data["success"] is False
+            assert "Failed to load entities" in data["error"]
 
     def test_get_scan_paths(self, client):
         """Test get scan paths endpoint."""
-        with patch("backend.api.os.path.exists") as mock_exists:
-            mock_exists.side_effect = [
-                True,
-                False,
-                True,
-            ]  # First path exists, second doesn't, test path exists
-
-            with patch("backend.api.Path") as mock_path:
-                # Mock Path.rglob to return some .tf files
-                mock_path_instance = MagicMock()
-                mock_path_instance.rglob.return_value = ["main.tf", "variables.tf"]
-                mock_path.return_value = mock_path_instance
-
-                with patch.dict(
-                    os.environ, {"TF_SCAN_PATHS": "/app/project/terraform,/app/project/missing"}
-                ):
-                    response = client.get("/api/scan-paths")
-                    assert response.status_code == 200
-
-                    data = json.loads(response.data)
-                    assert data["success"] is True
-                    assert "paths" in data
-                    assert len(data["paths"]) == 2  # One configured path + test path
-
-                    # Check first path
-                    assert data["paths"][0]["path"] == "/app/project/terraform"
-                    assert data["paths"][0]["exists"] is True
-                    assert data["paths"][0]["file_count"] == 2
-
-                    # Check test path
-                    assert data["paths"][1]["path"] == "/app/test-terraform"
-                    assert data["paths"][1]["is_test"] is True
+        with (
+            # First path exists, second doesn't, test path exists
+            patch.object(backend_api.os.path, "exists", side_effect=[True, False, True]),
+            # Each existing path holds two .tf files
+            patch.object(backend_api, "_count_tf_files", return_value=(2, False)),
+            patch.object(
+                backend_api,
+                "_LISTED_SCAN_PATHS",
+                ("/app/project/terraform", "/app/project/missing"),
+            ),
+        ):
+            response = client.get("/api/scan-paths")
+            assert response.status_code == 200
+
+            data = response.get_json()
+            assert data["success"] is True
+            assert "paths" in data
+            assert len(data["paths"]) == 2  # One configured path + test path
+
+            # Check first path
+            assert data["paths"][0]["path"] == "/app/project/terraform"
+            assert data["paths"][0]["exists"] is True
+            assert data["paths"][0]["file_count"] == 2
+            assert data["paths"][0]["file_count_capped"] is False
+
+            # Check test path
+            assert data["paths"][1]["path"] == "/app/test-terraform"
+            assert data["paths"][1]["is_test"] is True
+
+    def test_get_scan_paths_flags_capped_count(self, client, tmp_path):
+        """Test scan paths mark file counts that stopped at the limit."""
+        for name in ("main.tf", "variables.tf", "outputs.tf"):
+            (tmp_path / name).write_text("")
+
+        with (
+            patch.object(backend_api, "_LISTED_SCAN_PATHS", (str(tmp_path),)),
+            patch.object(backend_api, "_TF_COUNT_LIMIT", 2),
+        ):
+            response = client.get("/api/scan-paths")
+
+        entry = response.get_json()["paths"][0]
+        assert entry["path"] == str(tmp_path)
+        assert entry["file_count"] == 2
+        assert entry["file_count_capped"] is True
+
+    def test_count_tf_files_tracks_nested_changes(self, tmp_path, monkeypatch):
+        """Test .tf counts reuse unchanged directory listings but see nested edits."""
+        nested = tmp_path / "modules" / "vpc"
+        nested.mkdir(parents=True)
+        (tmp_path / "main.tf").write_text("")
+        (tmp_path / "README.md").write_text("")
+        (nested / "main.tf").write_text("")
+
+        root = str(tmp_path)
+        assert backend_api._count_tf_files(root) == (2, False)
+
+        # Nothing changed: every directory listing is reused
+        with patch.object(backend_api.os, "scandir", side_effect=AssertionError("relisted")):
+            assert backend_api._count_tf_files(root) == (2, False)
+
+        (nested / "outputs.tf").write_text("")
+        assert backend_api._count_tf_files(root) == (3, False)
+
+        # Large trees are cut off at the configured limit
+        with patch.object(backend_api, "_TF_COUNT_LIMIT", 2):
+            assert backend_api._count_tf_files(root) == (2, True)
+
+        # Listings of directories that no longer exist are dropped from the memo
+        shutil.rmtree(tmp_path / "modules")
+        assert backend_api._count_tf_files(root) == (1, False)
+        assert not [d for d in backend_api._dir_listings if d.startswith(str(nested.parent))]
 
     def test_get_entities_test_data_parse_exception(self, client):
         """Test get entities when test data parsing fails silently."""
-        with patch("backend.api.os.path.exists") as mock_exists:
-
-            def exists_side_effect(path):
-                if "tf_entities.json" in path:
-                    return False
-                if "/app/project" in path:
-                    return False
-                if "/app/test-terraform" in path:
-                    return True
-                if "./terraform" in path:
-                    return False
-                return False
-
-            mock_exists.side_effect = exists_side_effect
-
-            with patch("backend.api.parse_terraform") as mock_parse:
-                # Test data parse fails, falls through to no files found
-                mock_parse.side_effect = Exception("Test parse failed")
-
-                response = client.get("/api/entities")
-                assert response.status_code == 404
+        with (
+            patch.object(
+                backend_api.os.path, "exists", side_effect=_make_exists("/app/test-terraform")
+            ),
+            # Test data parse fails, falls through to no files found
+            patch.object(
+                backend_api, "parse_terraform", side_effect=Exception("Test parse failed")
+            ),
+        ):
+            response = client.get("/api/entities")
+            assert response.status_code == 404
 
-                data = json.loads(response.data)
-                assert data["success"] is False
-                assert "No terraform files found" in data["error"]
+            data = response.get_json()
+            assert data["success"] is False
+            assert "No terraform files found" in data["error"]
 
     def test_get_entities_scan_path_parse_exception(self, client):
         """Test get entities when scan path parsing fails but continues."""
-        with patch("backend.api.os.path.exists") as mock_exists:
+        with (
             # No cache, first scan path exists but fails, test path exists and works
-            mock_exists.side_effect = [False, True, True]
-
-            with patch("backend.api.parse_terraform") as mock_parse:
-                # First call fails, second succeeds
-                mock_parse.side_effect = [
+            patch.object(backend_api.os.path, "exists", side_effect=[False, True, True]),
+            # First call fails, second succeeds
+            patch.object(
+                backend_api,
+                "parse_terraform",
+                side_effect=[
                     Exception("Parse error"),
                     {"entities": ["test"], "relationships": []},
-                ]
-
-                with patch.dict(os.environ, {"TF_SCAN_PATHS": "/app/project/terraform"}):
-                    response = client.get("/api/entities")
-                    assert response.status_code == 200
+                ],
+            ),
+            patch.object(backend_api, "_ENTITY_SCAN_PATHS", ("/app/project/terraform",)),
+        ):
+            response = client.get("/api/entities")
+            assert response.status_code == 200
 
-                    data = json.loads(response.data)
-                    assert data["success"] is True
-                    assert data["source"] == "test-data"
+            data = response.get_json()
+            assert data["success"] is True
+            assert data["source"] == "test-data"
@@ -1,23 +1,26 @@
 """Tests for Terraform parser module."""
 
-import json
-import os
-import sys
-import tempfile
+import re
+import time
 from pathlib import Path
 
+import hcl2
+import orjson
 import pytest
 
-# Add parent directory to path
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
-from backend.parser import TerraformParser, parse_terraform  # noqa: E402
+from backend import parser as backend_parser
+from backend.parser import (
+    _REF_RE,
+    TerraformParser,
+    _hcl_loads,
+    parse_terraform,
+)
 
 
 class TestTerraformParser:
     """Test suite for TerraformParser class."""
 
-    @pytest.fixture
+    @pytest.fixture(scope="session")
     def sample_terraform_config(self):
         """Create sample Terraform configuration for testing."""
         return """
@@ -75,13 +78,25 @@ class TestTerraformParser:
         }
         """
 
-    @pytest.fixture
-    def temp_tf_dir(self, sample_terraform_config):
+    @pytest.fixture(scope="session")
+    def temp_tf_dir(self, tmp_path_factory, sample_terraform_config):
         """Create temporary directory with Terraform configuration."""
-        with tempfile.TemporaryDirectory() as tmpdir:
-            tf_file = Path(tmpdir) / "main.tf"
-            tf_file.write_text(sample_terraform_config)
-            yield tmpdir
+        tf_dir = tmp_path_factory.mktemp("tf")
+        (tf_dir / "main.tf").write_text(sample_terraform_config)
+        return str(tf_dir)
+
+    @pytest.fixture(scope="session")
+    def parsed_sample(self, temp_tf_dir):
+        """Parse the sample configuration once; tests must treat it as read-only."""
+        parser = TerraformParser(temp_tf_dir)
+        parser.parse_directory()
+        return parser
+
+    @pytest.fixture(scope="session")
+    def parse_terraform_output(self, tmp_path_factory, temp_tf_dir):
+        """Run parse_terraform on the sample once and return its result and output path."""
+        output_path = tmp_path_factory.mktemp("out") / "out.json"
+        return parse_terraform(temp_tf_dir, str(output_path)), output_path
 
     def test_parser_initialization(self, temp_tf_dir):
         """Test parser initialization."""
@@ -115,75 +130,53 @@ class TestTerraformParser:
         assert "module.security" in entity_ids
         assert "provider.aws" in entity_ids
 
-    def test_extract_resources(self, temp_tf_dir):
-        """Test resource extraction."""
-        parser = TerraformParser(temp_tf_dir)
-        parser.parse_directory()
-
-        # Check VPC resource
-        vpc = parser.entities.get("resource.aws_vpc.main")
-        assert vpc is not None
-        assert vpc.type == "aws_vpc"
-        assert vpc.category == "resource"
-        assert vpc.name == "main"
-        assert vpc.provider == "aws"
-
-        # Check subnet resource
-        subnet = parser.entities.get("resource.aws_subnet.public")
-        assert subnet is not None
-        assert subnet.type == "aws_subnet"
-        assert "resource.aws_vpc.main" in subnet.dependencies
-
-    def test_extract_data_sources(self, temp_tf_dir):
-        """Test data source extraction."""
-        parser = TerraformParser(temp_tf_dir)
-        parser.parse_directory()
-
-        ami = parser.entities.get("data.aws_ami.ubuntu")
-        assert ami is not None
-        assert ami.type == "aws_ami"
-        assert ami.category == "data"
-        assert ami.name == "ubuntu"
-
-    def test_extract_variables(self, temp_tf_dir):
-        """Test variable extraction."""
-        parser = TerraformParser(temp_tf_dir)
-        parser.parse_directory()
-
-        var = parser.entities.get("var.instance_type")
-        assert var is not None
-        assert var.type == "variable"
-        assert var.category == "variable"
-        assert var.name == "instance_type"
-
-    def test_extract_outputs(self, temp_tf_dir):
-        """Test output extraction."""
-        parser = TerraformParser(temp_tf_dir)
-        parser.parse_directory()
-
-        output = parser.entities.get("output.instance_id")
-        assert output is not None
-        assert output.type == "output"
-        assert output.category == "output"
-        assert "resource.aws_instance.web" in output.dependencies
-
-    def test_extract_modules(self, temp_tf_dir):
-        """Test module extraction."""
-        parser = TerraformParser(temp_tf_dir)
-        parser.parse_directory()
-
-        module = parser.entities.get("module.security")
-        assert module is not None
-        assert module.type == "module"
-        assert module.category == "module"
-        assert "resource.aws_vpc.main" in module.dependencies
-
-    def test_extract_relationships(self, temp_tf_dir):
+    @pytest.mark.parametrize(
+        ("entity_id", "attrs", "depends_on"),
+        [
+            (
+                "resource.aws_vpc.main",
+                {"type": "aws_vpc", "category": "resource", "name": "main", "provider": "aws"},
+                [],
+            ),
+            (
+                "resource.aws_subnet.public",
+                {"type": "aws_subnet"},
+                ["resource.aws_vpc.main"],
+            ),
+            (
+                "data.aws_ami.ubuntu",
+                {"type": "aws_ami", "category": "data", "name": "ubuntu"},
+                [],
+            ),
+            (
+                "var.instance_type",
+                {"type": "variable", "category": "variable", "name": "instance_type"},
+                [],
+            ),
+            (
+                "output.instance_id",
+                {"type": "output", "category": "output"},
+                ["resource.aws_instance.web"],
+            ),
+            (
+                "module.security",
+                {"type": "module", "category": "module"},
+                ["resource.aws_vpc.main"],
+            ),
+        ],
+    )
+    def test_extract(self, parsed_sample, entity_id, attrs, depends_on):
+        """Test extraction of each entity kind from the sample configuration."""
+        entity = parsed_sample.entities.get(entity_id)
+        assert entity is not None
+        for key, value in attrs.items():
+            assert getattr(entity, key) == value
+        for dep in depends_on:
+            assert dep in entity.dependencies
+
+    def test_extract_relationships(self, parsed_sample):
         """Test relationship extraction."""
-        parser = TerraformParser(temp_tf_dir)
-        result = parser.parse_directory()
-
-        relationships = result["relationships"]
+        relationships = parsed_sample.relationships
         assert len(relationships) > 0
 
         # Check for expected relationships
@@ -210,6 +203,8 @@ class TestTerraformParser:
 
         refs = parser._find_references("data.aws_ami.ubuntu.id")
         assert "data.aws_ami.ubuntu" in refs
+        # The data source type must not also be read as a bare AWS resource
+        assert "resource.aws_ami.ubuntu" not in refs
 
         refs = parser._find_references("var.instance_type")
         assert "var.instance_type" in refs
@@ -217,85 +212,314 @@ class TestTerraformParser:
         refs = parser._find_references("module.security.output_value")
         assert "module.security" in refs
 
-    def test_calculate_layout(self, temp_tf_dir):
-        """Test layout calculation for visualization."""
+        # References only start at identifier boundaries
+        refs = parser._find_references("my_aws_vpc.main")
+        assert refs == set()
+
+    def test_find_references_uses_precompiled_pattern(self, temp_tf_dir, monkeypatch):
+        """Test reference scanning reuses the module-level pattern instead of compiling."""
+        assert isinstance(_REF_RE, re.Pattern)
+
+        def fail(*args, **kwargs):
+            raise AssertionError("_find_references compiled a regex per call")
+
+        monkeypatch.setattr(re, "compile", fail)
+        monkeypatch.setattr(re, "finditer", fail)
+        monkeypatch.setattr(re, "findall", fail)
+        refs = TerraformParser(temp_tf_dir)._find_references("${aws_vpc.main.id}")
+        assert refs == {"resource.aws_vpc.main"}
+
+    def test_extract_dependencies_nested(self, temp_tf_dir):
+        """Test dependencies are found at any nesting depth."""
         parser = TerraformParser(temp_tf_dir)
-        parser.parse_directory()
-        parser.calculate_layout()
+
+        config = {
+            "depends_on": ["aws_iam_role.node"],
+            "ingress": [{"rule": [{"cidr_blocks": ["${var.allowed_cidr}"]}]}],
+            "lifecycle": {"replace": {"trigger": "${module.network.id}"}},
+            "matrix": [["${local.zone}"]],
+        }
+        deps = parser._extract_dependencies(config)
+
+        assert set(deps) == {
+            "aws_iam_role.node",
+            "resource.aws_iam_role.node",
+            "var.allowed_cidr",
+            "module.network",
+            "local.zone",
+        }
+
+    def test_extract_dependencies_values_do_not_merge(self, temp_tf_dir):
+        """Test adjacent string values are never joined into one reference."""
+        parser = TerraformParser(temp_tf_dir)
+
+        deps = parser._extract_dependencies({"a": "aws_vpc", "b": ".main", "c": ["var", ".x"]})
+
+        assert deps == set()
+
+    def test_find_references_pathological_input(self, temp_tf_dir):
+        """Test reference scanning stays linear on adversarial strings."""
+        parser = TerraformParser(temp_tf_dir)
+
+        def best_time(text: str) -> float:
+            timings = []
+            for _ in range(3):
+                start = time.perf_counter()
+                parser._find_references(text)
+                timings.append(time.perf_counter() - start)
+            return min(timings)
+
+        # Ten times the input should take about ten times as long; a quadratic
+        # scan would take a hundred times, so compare with a generous margin
+        # instead of an absolute deadline that depends on the machine
+        for make_text in [
+            lambda n: "a" * (5 * n) + ".",
+            lambda n: "aws_" * n,
+            lambda n: "var." * n,
+        ]:
+            small = best_time(make_text(2_000))
+            large = best_time(make_text(20_000))
+            assert large < 40 * small
+
+    def test_calculate_layout(self, parsed_sample):
+        """Test layout calculation for visualization."""
+        parsed_sample.calculate_layout()
 
         # Check that all entities have positions
-        for entity in parser.entities.values():
+        for entity in parsed_sample.entities.values():
             assert entity.position is not None
             assert "x" in entity.position
             assert "y" in entity.position
             assert isinstance(entity.position["x"], int)
             assert isinstance(entity.position["y"], int)
 
-    def test_save_to_json(self, temp_tf_dir):
+    def test_save_to_json(self, temp_tf_dir, tmp_path):
         """Test saving to JSON file."""
         parser = TerraformParser(temp_tf_dir)
+        output_path = tmp_path / "out.json"
 
-        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as tmp:
-            output_path = tmp.name
+        parser.save_to_json(str(output_path))
 
-        try:
-            parser.save_to_json(output_path)
+        # Check file exists and is valid JSON
+        assert output_path.exists()
 
-            # Check file exists and is valid JSON
-            assert Path(output_path).exists()
+        data = orjson.loads(output_path.read_bytes())
 
-            with open(output_path) as f:
-                data = json.load(f)
+        assert "entities" in data
+        assert "relationships" in data
+        assert "metadata" in data
+        assert len(data["entities"]) == data["metadata"]["total_entities"]
+        assert len(data["relationships"]) == data["metadata"]["total_relationships"]
 
-            assert "entities" in data
-            assert "relationships" in data
-            assert "metadata" in data
+    def test_parse_terraform_function(self, parse_terraform_output):
+        """Test main parse_terraform function."""
+        result, output_path = parse_terraform_output
 
-        finally:
-            Path(output_path).unlink(missing_ok=True)
+        assert "entities" in result
+        assert "relationships" in result
+        assert "metadata" in result
 
-    def test_parse_terraform_function(self, temp_tf_dir):
-        """Test main parse_terraform function."""
-        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as tmp:
-            output_path = tmp.name
+        # Check file was created
+        assert output_path.exists()
+
+    def test_parse_directory_multiple_files(self, tmp_path, monkeypatch):
+        """Test parsing a directory split across several files uses the worker pool."""
+        # Force the process pool even for tiny inputs on single-core runners
+        monkeypatch.setattr("backend.parser._PARALLEL_MIN_BYTES", 0)
+        monkeypatch.setattr("backend.parser.os.cpu_count", lambda: 2)
+        (tmp_path / "network.tf").write_text(
+            'resource "aws_vpc" "main" {\n  cidr_block = "10.0.0.0/16"\n}\n'
+        )
+        (tmp_path / "compute.tf").write_text(
+            'resource "aws_subnet" "public" {\n  vpc_id = aws_vpc.main.id\n}\n'
+        )
+        nested = tmp_path / "nested"
+        nested.mkdir()
+        (nested / "vars.tf").write_text('variable "region" {\n  default = "us-east-1"\n}\n')
+
+        parser = TerraformParser(str(tmp_path))
+        result = parser.parse_directory()
+
+        # Workers never come from fork, which is unsafe from threaded callers
+        assert backend_parser._worker_context().get_start_method() != "fork"
+
+        assert result["metadata"]["total_files"] == 3
+        assert set(parser.entities) == {
+            "resource.aws_vpc.main",
+            "resource.aws_subnet.public",
+            "var.region",
+        }
+        assert {
+            "source": "resource.aws_subnet.public",
+            "target": "resource.aws_vpc.main",
+            "type": "depends_on",
+        } in result["relationships"]
+
+    def test_parse_directory_serial_skips_pool(self, tmp_path, monkeypatch):
+        """Test parallel=False parses in-process even when the pool would pay off."""
+        monkeypatch.setattr("backend.parser._PARALLEL_MIN_BYTES", 0)
+        monkeypatch.setattr("backend.parser.os.cpu_count", lambda: 2)
+        monkeypatch.setattr("backend.parser.ProcessPoolExecutor", None)
+        (tmp_path / "a.tf").write_text('variable "a" {}\n')
+        (tmp_path / "b.tf").write_text('variable "b" {}\n')
+
+        parser = TerraformParser(str(tmp_path), parallel=False)
+        parser.parse_directory()
+
+        assert set(parser.entities) == {"var.a", "var.b"}
+
+    def test_identical_attributes_are_shared(self, tmp_path):
+        """Test structurally identical blocks across files share one attributes dict."""
+        block = 'resource "aws_s3_bucket" "{name}" {{\n  tags = {{ Team = "infra" }}\n}}\n'
+        (tmp_path / "dev.tf").write_text(block.format(name="logs"))
+        (tmp_path / "prod.tf").write_text(block.format(name="logs_prod"))
+
+        parser = TerraformParser(str(tmp_path))
+        parser.parse_directory()
+
+        dev = parser.entities["resource.aws_s3_bucket.logs"]
+        prod = parser.entities["resource.aws_s3_bucket.logs_prod"]
+        assert dev.attributes is prod.attributes
+
+    def test_parse_terraform_parses_once(self, parse_terraform_output, parsed_sample):
+        """Test parse_terraform does not duplicate relationships by parsing twice."""
+        result, output_path = parse_terraform_output
+
+        assert len(result["relationships"]) == len(parsed_sample.relationships)
+        assert orjson.loads(output_path.read_bytes())["metadata"] == result["metadata"]
 
-        try:
-            result = parse_terraform(temp_tf_dir, output_path)
+    def test_parse_cache_reuses_unchanged_files(self, tmp_path, monkeypatch):
+        """Test unchanged files are served from the parse cache."""
+        tf_file = tmp_path / "main.tf"
+        tf_file.write_text('resource "aws_vpc" "main" {\n  cidr_block = "10.0.0.0/16"\n}\n')
 
-            assert "entities" in result
-            assert "relationships" in result
-            assert "metadata" in result
+        first = TerraformParser(str(tmp_path)).parse_directory()
+        # The cache goes to the cache dir, never into the scanned tree
+        assert [p.name for p in tmp_path.iterdir()] == ["main.tf"]
 
-            # Check file was created
-            assert Path(output_path).exists()
+        def fail(path):
+            raise AssertionError(f"{path} should have been served from cache")
 
-        finally:
-            Path(output_path).unlink(missing_ok=True)
+        monkeypatch.setattr("backend.parser.parse_file_worker", fail)
+        second = TerraformParser(str(tmp_path)).parse_directory()
+        assert second == first
 
-    def test_empty_directory(self):
+    def test_relationships_built_once(self, tmp_path):
+        """Test edge dicts are built once and cached entries keep the columns."""
+        (tmp_path / "main.tf").write_text(
+            'resource "aws_vpc" "main" {}\n'
+            'resource "aws_subnet" "a" {\n  vpc_id = aws_vpc.main.id\n}\n'
+        )
+        parser = TerraformParser(str(tmp_path))
+        result = parser.parse_directory()
+
+        assert parser.relationships is result["relationships"]
+        assert parser.relationships is parser.relationships
+
+        entry = orjson.loads(parser._cache_path.read_bytes())["files"]["main.tf"]
+        assert entry["edges"] == [
+            ["resource.aws_subnet.a"],
+            ["resource.aws_vpc.main"],
+            ["depends_on"],
+        ]
+
+    def test_parse_cache_invalidated_on_change(self, tmp_path):
+        """Test a modified file is reparsed instead of served from cache."""
+        tf_file = tmp_path / "main.tf"
+        tf_file.write_text('variable "region" {}\n')
+        TerraformParser(str(tmp_path)).parse_directory()
+
+        tf_file.write_text('variable "region" {}\nvariable "zone" {}\n')
+        parser = TerraformParser(str(tmp_path))
+        parser.parse_directory()
+
+        assert set(parser.entities) == {"var.region", "var.zone"}
+
+    @pytest.mark.parametrize(
+        "entry",
+        [
+            {"entities": []},
+            1,
+            "stamp",
+            {"stamp": None, "entities": [], "relationships": []},
+            {"stamp": "match", "entities": [{"id": "x", "unexpected": 1}], "relationships": []},
+            {"stamp": "match", "entities": [], "relationships": [{"source": "a"}]},
+            {"stamp": "match", "entities": [], "edges": [["a"], [], []]},
+            {"stamp": "match", "entities": [], "edges": [["a"]]},
+            {"stamp": "match", "entities": [], "edges": ["a", "b", "c"]},
+        ],
+    )
+    def test_parse_cache_malformed_entry_is_reparsed(self, tmp_path, entry):
+        """Test a malformed cache entry is treated as a miss and rewritten."""
+        tf_file = tmp_path / "main.tf"
+        tf_file.write_text('variable "region" {}\n')
+        parser = TerraformParser(str(tmp_path))
+        expected = parser.parse_directory()
+
+        cache = orjson.loads(parser._cache_path.read_bytes())
+        st = tf_file.stat()
+        if isinstance(entry, dict) and entry.get("stamp") == "match":
+            entry["stamp"] = [st.st_mtime_ns, st.st_size]
+        cache["files"]["main.tf"] = entry
+        parser._cache_path.write_bytes(orjson.dumps(cache))
+
+        assert TerraformParser(str(tmp_path)).parse_directory() == expected
+        cache = orjson.loads(parser._cache_path.read_bytes())
+        assert cache["files"]["main.tf"]["stamp"] == [st.st_mtime_ns, st.st_size]
+
+    def test_parse_cache_discarded_on_version_change(self, tmp_path, monkeypatch):
+        """Test results cached by another parser version are not reused."""
+        (tmp_path / "main.tf").write_text('variable "region" {}\n')
+        parser = TerraformParser(str(tmp_path))
+        parser.parse_directory()
+
+        cache = orjson.loads(parser._cache_path.read_bytes())
+        cache["version"] = "older-parser"
+        parser._cache_path.write_bytes(orjson.dumps(cache))
+
+        parsed = []
+        original = backend_parser.parse_file_worker
+
+        def spy(path):
+            parsed.append(path)
+            return original(path)
+
+        monkeypatch.setattr(backend_parser, "parse_file_worker", spy)
+        TerraformParser(str(tmp_path)).parse_directory()
+        assert parsed == [str(tmp_path / "main.tf")]
+
+    def test_hcl_loads_matches_hcl2(self, sample_terraform_config):
+        """Test the position-free HCL parser returns the same structure as hcl2."""
+        assert _hcl_loads(sample_terraform_config) == hcl2.loads(sample_terraform_config)
+
+    def test_empty_directory(self, tmp_path):
         """Test parsing empty directory."""
-        with tempfile.TemporaryDirectory() as tmpdir:
-            parser = TerraformParser(tmpdir)
-            result = parser.parse_directory()
+        parser = TerraformParser(str(tmp_path))
+        result = parser.parse_directory()
 
-            assert result["metadata"]["total_files"] == 0
-            assert result["metadata"]["total_entities"] == 0
-            assert result["metadata"]["total_relationships"] == 0
-            assert result["entities"] == []
-            assert result["relationships"] == []
+        assert result["metadata"]["total_files"] == 0
+        assert result["metadata"]["total_entities"] == 0
+        assert result["metadata"]["total_relationships"] == 0
+        assert result["entities"] == []
+        assert result["relationships"] == []
 
-    def test_invalid_hcl(self):
-        """Test handling of invalid HCL content."""
-        with tempfile.TemporaryDirectory() as tmpdir:
-            tf_file = Path(tmpdir) / "invalid.tf"
-            tf_file.write_text("this is not valid HCL {{{")
+    def test_parse_text(self, sample_terraform_config, parsed_sample):
+        """Test parsing source held in memory matches parsing it from disk."""
+        parser = TerraformParser(".")
+        parser.parse_text(sample_terraform_config)
+
+        assert set(parser.entities) == set(parsed_sample.entities)
+        assert len(parser.relationships) == len(parsed_sample.relationships)
 
-            parser = TerraformParser(tmpdir)
-            result = parser.parse_directory()
+    def test_invalid_hcl(self, capsys):
+        """Test handling of invalid HCL content."""
+        parser = TerraformParser(".")
+        parser.parse_text("this is not valid HCL {{{", source="invalid.tf")
 
-            # Should handle error gracefully
-            assert result["metadata"]["total_files"] == 1
-            assert result["metadata"]["total_entities"] == 0
+        # Should handle error gracefully
+        assert parser.entities == {}
+        assert parser.relationships == []
+        assert "Error parsing invalid.tf" in capsys.readouterr().out
 
 
 if __name__ == "__main__":
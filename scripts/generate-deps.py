@@ -16,20 +16,80 @@ Outputs:
 """
 
 import ast
+import hashlib
 import json
+import os
 import re
 import subprocess
 import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Callable, Dict, Iterable, List, Any, Optional, Tuple
 import argparse
 
+try:
+    import orjson
+except ImportError:  # Optional speedup; the script runs on a bare python3
+    orjson = None
+
+# Directory names that are never descended into (vendored, generated or cache trees)
+_SKIP_DIRS = frozenset(
+    {
+        ".git",
+        "__pycache__",
+        ".venv",
+        "venv",
+        "node_modules",
+        ".terraform",
+        ".cache",
+        "work",
+        ".mypy_cache",
+        ".pytest_cache",
+        ".ruff_cache",
+        "coverage",
+        "dist",
+        "build",
+    }
+)
+
+# Extractor patterns, compiled once rather than looked up in re's cache per file
+# ES6 `import ... from "x"` (may span lines) or CommonJS `require("x")`, matched
+# in one pass over the raw bytes
+_RE_JS_IMPORT = re.compile(
+    rb"\bimport\b[^'\"]*?\bfrom\s+['\"]([^'\"]+)['\"]"
+    rb"|\brequire\s*\(\s*['\"]([^'\"]+)['\"]\s*\)"
+)
+_RE_TF_MODULE = re.compile(
+    rb'module\s+"[^"]+"\s*\{[^}]*source\s*=\s*"([^"]+)"', re.DOTALL
+)
+_RE_GHA_USES = re.compile(rb"uses:\s*([^\s]+)")
+_RE_GHA_WORKFLOW = re.compile(rb"workflow_call|workflow_dispatch")
+_RE_GHA_SECRET = re.compile(rb"\$\{\{\s*secrets\.([^}]+)\s*\}\}")
+_RE_MERMAID_UNSAFE = re.compile(r"[^a-zA-Z0-9_]")
+
+# Statement-list fields of compound Python statements (if/for/while/with/try/def)
+_PY_BLOCK_FIELDS = ("body", "orelse", "finalbody")
+
+# Characters allowed in a Makefile target name (pattern rules and .SPECIAL targets
+# are not reported)
+_MAKE_TARGET_CHARS = frozenset(
+    b"abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_-"
+)
+
+
+def _decode_all(values: Iterable[bytes]) -> List[str]:
+    """Decode matched byte strings; files are scanned as bytes, not decoded whole"""
+    return [value.decode("utf-8") for value in values]
+
 
 class DependencyAnalyzer:
     """Main dependency analysis coordinator"""
 
-    def __init__(self, project_root: Path):
+    def __init__(self, project_root: Path, use_cache: bool = True):
         self.project_root = project_root
+        self.use_cache = use_cache
+        self._cache_path = project_root / ".cache" / "deps.json"
         self.dependencies = {
             "python": {},
             "javascript": {},
@@ -38,262 +98,393 @@ class DependencyAnalyzer:
             "docker": {},
             "github_actions": {},
         }
+        self._files: Optional[Dict[str, List[Path]]] = None
+        # Per-type {rel_path: [content digest, extracted result]} from the last
+        # run, and the entries seen by this one
+        self._cache: Dict[str, Dict[str, List[Any]]] = {}
+        self._fresh_cache: Dict[str, Dict[str, List[Any]]] = {
+            dep_type: {} for dep_type in self.dependencies
+        }
 
     def analyze_all(self) -> Dict[str, Any]:
         """Run all dependency analyses"""
         print("🔍 Analyzing project dependencies...")
 
-        self.analyze_python_imports()
-        self.analyze_javascript_imports()
-        self.analyze_makefile_targets()
-        self.analyze_terraform_modules()
-        self.analyze_docker_dependencies()
-        self.analyze_github_actions()
+        analyzers = {
+            "python": "analyze_python_imports",
+            "javascript": "analyze_javascript_imports",
+            "makefile": "analyze_makefile_targets",
+            "terraform": "analyze_terraform_modules",
+            "docker": "analyze_docker_dependencies",
+            "github_actions": "analyze_github_actions",
+        }
+
+        # Walk the tree once up front; each analyzer is handed only its own bucket
+        # and cache slice, not the whole analyzer
+        files = self._collect_files()
+        self._load_cache()
+        jobs = {
+            dep_type: (
+                self.project_root,
+                dep_type,
+                name,
+                files[dep_type],
+                self._cache.get(dep_type, {}),
+            )
+            for dep_type, name in analyzers.items()
+        }
+
+        # Analyzers cover disjoint file sets, so run them in separate processes
+        workers = min(len(analyzers), os.cpu_count() or 1)
+        if workers <= 1:
+            results = {dep_type: _run_analyzer(*job) for dep_type, job in jobs.items()}
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {
+                    dep_type: executor.submit(_run_analyzer, *job)
+                    for dep_type, job in jobs.items()
+                }
+                results = {
+                    dep_type: future.result() for dep_type, future in futures.items()
+                }
+
+        # Files arrive in directory-walk order, which varies between filesystems;
+        # sorting once here keeps the generated outputs stable
+        for dep_type, (deps, cache_entries) in results.items():
+            self.dependencies[dep_type] = dict(sorted(deps.items()))
+            self._fresh_cache[dep_type] = cache_entries
+        self._save_cache()
 
         return self.dependencies
 
-    def analyze_python_imports(self):
+    def analyze_python_imports(self) -> Dict[str, List[str]]:
         """Analyze Python import dependencies"""
         print("🐍 Analyzing Python imports...")
 
-        python_files = list(self.project_root.rglob("*.py"))
+        python_files = self._collect_files()["python"]
 
         for py_file in python_files:
-            if self._should_skip_path(py_file):
-                continue
-
             try:
-                with open(py_file, "r", encoding="utf-8") as f:
-                    content = f.read()
-
-                tree = ast.parse(content)
-                imports = self._extract_python_imports(tree)
-
-                rel_path = str(py_file.relative_to(self.project_root))
-                self.dependencies["python"][rel_path] = imports
-
+                self._analyze_file("python", py_file, self._parse_python_imports)
             except Exception as e:
                 print(f"⚠️  Error parsing {py_file}: {e}")
 
-    def analyze_javascript_imports(self):
+        return self.dependencies["python"]
+
+    def analyze_javascript_imports(self) -> Dict[str, List[str]]:
         """Analyze JavaScript/TypeScript import dependencies"""
         print("📦 Analyzing JavaScript/TypeScript imports...")
 
-        js_files = (
-            list(self.project_root.rglob("*.js"))
-            + list(self.project_root.rglob("*.ts"))
-            + list(self.project_root.rglob("*.tsx"))
-            + list(self.project_root.rglob("*.jsx"))
-        )
+        js_files = self._collect_files()["javascript"]
 
         for js_file in js_files:
-            if self._should_skip_path(js_file):
-                continue
-
             try:
-                with open(js_file, "r", encoding="utf-8") as f:
-                    content = f.read()
-
-                imports = self._extract_js_imports(content)
-
-                rel_path = str(js_file.relative_to(self.project_root))
-                self.dependencies["javascript"][rel_path] = imports
-
+                self._analyze_file("javascript", js_file, self._extract_js_imports)
             except Exception as e:
                 print(f"⚠️  Error parsing {js_file}: {e}")
 
-    def analyze_makefile_targets(self):
+        return self.dependencies["javascript"]
+
+    def analyze_makefile_targets(self) -> Dict[str, Dict[str, List[str]]]:
         """Analyze Makefile target dependencies"""
         print("🔨 Analyzing Makefile targets...")
 
-        makefiles = list(self.project_root.rglob("Makefile")) + list(
-            self.project_root.rglob("*.mk")
-        )
+        makefiles = self._collect_files()["makefile"]
 
         for makefile in makefiles:
             try:
-                with open(makefile, "r", encoding="utf-8") as f:
-                    content = f.read()
-
-                targets = self._extract_makefile_targets(content)
-
-                rel_path = str(makefile.relative_to(self.project_root))
-                self.dependencies["makefile"][rel_path] = targets
-
+                self._analyze_file("makefile", makefile, self._extract_makefile_targets)
             except Exception as e:
                 print(f"⚠️  Error parsing {makefile}: {e}")
 
-    def analyze_terraform_modules(self):
+        return self.dependencies["makefile"]
+
+    def analyze_terraform_modules(self) -> Dict[str, List[str]]:
         """Analyze Terraform module dependencies"""
         print("🏗️  Analyzing Terraform modules...")
 
-        tf_files = list(self.project_root.rglob("*.tf"))
+        tf_files = self._collect_files()["terraform"]
 
         for tf_file in tf_files:
-            if self._should_skip_path(tf_file):
-                continue
-
             try:
-                with open(tf_file, "r", encoding="utf-8") as f:
-                    content = f.read()
-
-                modules = self._extract_terraform_modules(content)
-
-                rel_path = str(tf_file.relative_to(self.project_root))
-                self.dependencies["terraform"][rel_path] = modules
-
+                self._analyze_file(
+                    "terraform", tf_file, self._extract_terraform_modules
+                )
             except Exception as e:
                 print(f"⚠️  Error parsing {tf_file}: {e}")
 
-    def analyze_docker_dependencies(self):
+        return self.dependencies["terraform"]
+
+    def analyze_docker_dependencies(self) -> Dict[str, Dict[str, List[str]]]:
         """Analyze Docker build dependencies"""
         print("🐳 Analyzing Docker dependencies...")
 
-        dockerfiles = list(self.project_root.rglob("Dockerfile*"))
+        dockerfiles = self._collect_files()["docker"]
 
         for dockerfile in dockerfiles:
             try:
-                with open(dockerfile, "r", encoding="utf-8") as f:
-                    content = f.read()
-
-                deps = self._extract_docker_dependencies(content)
-
-                rel_path = str(dockerfile.relative_to(self.project_root))
-                self.dependencies["docker"][rel_path] = deps
-
+                self._analyze_file(
+                    "docker", dockerfile, self._extract_docker_dependencies
+                )
             except Exception as e:
                 print(f"⚠️  Error parsing {dockerfile}: {e}")
 
-    def analyze_github_actions(self):
+        return self.dependencies["docker"]
+
+    def analyze_github_actions(self) -> Dict[str, Dict[str, List[str]]]:
         """Analyze GitHub Actions workflow dependencies"""
         print("⚙️  Analyzing GitHub Actions workflows...")
 
-        workflow_files = list(
-            (self.project_root / ".github" / "workflows").rglob("*.yml")
-        ) + list((self.project_root / ".github" / "workflows").rglob("*.yaml"))
+        workflow_files = self._collect_files()["github_actions"]
 
         for workflow_file in workflow_files:
             try:
-                with open(workflow_file, "r", encoding="utf-8") as f:
-                    content = f.read()
-
-                deps = self._extract_github_actions_deps(content)
-
-                rel_path = str(workflow_file.relative_to(self.project_root))
-                self.dependencies["github_actions"][rel_path] = deps
-
+                self._analyze_file(
+                    "github_actions", workflow_file, self._extract_github_actions_deps
+                )
             except Exception as e:
                 print(f"⚠️  Error parsing {workflow_file}: {e}")
 
-    def _should_skip_path(self, path: Path) -> bool:
-        """Check if path should be skipped"""
-        skip_patterns = [
-            ".git",
-            "__pycache__",
-            ".venv",
-            "venv",
-            "node_modules",
-            ".terraform",
-            "work",
-            ".mypy_cache",
-            ".pytest_cache",
-            ".ruff_cache",
-            "coverage",
-            "dist",
-            "build",
-        ]
-
-        return any(pattern in str(path) for pattern in skip_patterns)
+        return self.dependencies["github_actions"]
+
+    def _collect_files(self) -> Dict[str, List[Path]]:
+        """Walk the project once and bucket files by the analyzer that reads them"""
+        if self._files is not None:
+            return self._files
+
+        # One list per original glob, concatenated below in the same order
+        globs: Dict[str, List[Path]] = {
+            name: []
+            for name in (
+                "*.py",
+                "*.js",
+                "*.ts",
+                "*.tsx",
+                "*.jsx",
+                "Makefile",
+                "*.mk",
+                "*.tf",
+                "Dockerfile*",
+                "workflows/*.yml",
+                "workflows/*.yaml",
+            )
+        }
+        workflows_dir = os.path.join(self.project_root, ".github", "workflows")
+
+        for dirpath, dirnames, filenames in os.walk(self.project_root):
+            # Prune in place so skipped trees are never listed at all
+            dirnames[:] = [d for d in dirnames if d not in _SKIP_DIRS]
+            directory = Path(dirpath)
+            in_workflows = dirpath == workflows_dir or dirpath.startswith(
+                workflows_dir + os.sep
+            )
+            for name in filenames:
+                matches = [
+                    "*" + suffix
+                    for suffix in (".py", ".js", ".ts", ".tsx", ".jsx", ".mk", ".tf")
+                    if name.endswith(suffix)
+                ]
+                if name == "Makefile":
+                    matches.append("Makefile")
+                if name.startswith("Dockerfile"):
+                    matches.append("Dockerfile*")
+                if in_workflows:
+                    matches.extend(
+                        "workflows/*" + suffix
+                        for suffix in (".yml", ".yaml")
+                        if name.endswith(suffix)
+                    )
+                # Only build Path objects for files some analyzer will read
+                if matches:
+                    path = directory / name
+                    for pattern in matches:
+                        globs[pattern].append(path)
+
+        self._files = {
+            "python": globs["*.py"],
+            "javascript": globs["*.js"]
+            + globs["*.ts"]
+            + globs["*.tsx"]
+            + globs["*.jsx"],
+            "makefile": globs["Makefile"] + globs["*.mk"],
+            "terraform": globs["*.tf"],
+            "docker": globs["Dockerfile*"],
+            "github_actions": globs["workflows/*.yml"] + globs["workflows/*.yaml"],
+        }
+        return self._files
+
+    def _analyze_file(
+        self, dep_type: str, path: Path, extract: Callable[[bytes], Any]
+    ) -> None:
+        """Record the dependencies of one file, reusing the cached result if the
+        file's content is unchanged since the last run"""
+        with open(path, "rb") as f:
+            content = f.read()
+
+        rel_path = str(path.relative_to(self.project_root))
+        digest = hashlib.blake2b(content, digest_size=16).hexdigest()
+
+        cached = self._cache.get(dep_type, {}).get(rel_path)
+        if cached is not None and cached[0] == digest:
+            result = cached[1]
+        else:
+            result = extract(content)
 
-    def _extract_python_imports(self, tree: ast.AST) -> List[str]:
-        """Extract import statements from Python AST"""
-        imports = []
+        self._fresh_cache[dep_type][rel_path] = [digest, result]
+        self.dependencies[dep_type][rel_path] = result
 
-        for node in ast.walk(tree):
-            if isinstance(node, ast.Import):
-                for alias in node.names:
-                    imports.append(alias.name)
-            elif isinstance(node, ast.ImportFrom):
-                if node.module:
-                    imports.append(node.module)
+    def _cache_version(self) -> str:
+        """Digest of this script, so editing an extractor invalidates the cache"""
+        return hashlib.blake2b(Path(__file__).read_bytes(), digest_size=16).hexdigest()
 
-        return sorted(set(imports))
+    def _load_cache(self):
+        """Load the results of the previous run, if any and still valid"""
+        if not self.use_cache:
+            return
+        try:
+            data = self._cache_path.read_bytes()
+            cache = orjson.loads(data) if orjson else json.loads(data)
+        except (OSError, ValueError):
+            return
+        if isinstance(cache, dict) and cache.get("version") == self._cache_version():
+            self._cache = cache.get("files", {})
 
-    def _extract_js_imports(self, content: str) -> List[str]:
-        """Extract import statements from JavaScript/TypeScript"""
+    def _save_cache(self):
+        """Persist this run's results, dropping entries for deleted files"""
+        if not self.use_cache:
+            return
+        cache = {"version": self._cache_version(), "files": self._fresh_cache}
+        try:
+            self._cache_path.parent.mkdir(parents=True, exist_ok=True)
+            if orjson:
+                self._cache_path.write_bytes(orjson.dumps(cache))
+            else:
+                self._cache_path.write_text(json.dumps(cache), encoding="utf-8")
+        except OSError as e:
+            print(f"⚠️  Could not write dependency cache {self._cache_path}: {e}")
+
+    def _parse_python_imports(self, content: bytes) -> List[str]:
+        """Parse a Python source file and extract its imports"""
+        # ast.parse decodes bytes itself, honouring any PEP 263 coding cookie
+        return self._extract_python_imports(ast.parse(content))
+
+    def _extract_python_imports(self, tree: ast.Module) -> List[str]:
+        """Extract import statements from Python AST"""
         imports = []
 
-        # ES6 imports
-        import_pattern = r"import.*?from\s+['\"]([^'\"]+)['\"]"
-        imports.extend(re.findall(import_pattern, content))
-
-        # CommonJS requires
-        require_pattern = r"require\s*\(\s*['\"]([^'\"]+)['\"]\s*\)"
-        imports.extend(re.findall(require_pattern, content))
+        # Imports are statements, so only statement blocks are visited (module,
+        # function, class, if/try/with/loop bodies); expression trees, which make
+        # up most of a module's nodes, are never descended into
+        pending = deque([tree.body])
+        while pending:
+            for node in pending.popleft():
+                if isinstance(node, ast.Import):
+                    for alias in node.names:
+                        imports.append(alias.name)
+                elif isinstance(node, ast.ImportFrom):
+                    if node.module:
+                        imports.append(node.module)
+                else:
+                    for field in _PY_BLOCK_FIELDS:
+                        block = getattr(node, field, None)
+                        if block:
+                            pending.append(block)
+                    for clause in getattr(node, "handlers", None) or getattr(
+                        node, "cases", ()
+                    ):
+                        pending.append(clause.body)
+
+        # First-seen order is already deterministic, so no sort is needed
+        return list(dict.fromkeys(imports))
+
+    def _extract_js_imports(self, content: bytes) -> List[str]:
+        """Extract import statements from JavaScript/TypeScript"""
+        imports = [
+            (es6 or commonjs).decode("utf-8")
+            for es6, commonjs in _RE_JS_IMPORT.findall(content)
+        ]
 
-        return sorted(set(imports))
+        return list(dict.fromkeys(imports))
 
-    def _extract_makefile_targets(self, content: str) -> Dict[str, List[str]]:
+    def _extract_makefile_targets(self, content: bytes) -> Dict[str, List[str]]:
         """Extract Makefile targets and their dependencies"""
         targets = {}
 
-        # Match target lines: target: dependencies
-        target_pattern = r"^([a-zA-Z0-9_-]+)\s*:\s*([^#\n]*)"
-
-        for match in re.finditer(target_pattern, content, re.MULTILINE):
-            target = match.group(1).strip()
-            deps = [dep.strip() for dep in match.group(2).split() if dep.strip()]
-            targets[target] = deps
+        # Target lines look like `target: dependencies`; recipe lines start with a
+        # tab and variable assignments (`VAR := value`) are not targets
+        for line in content.splitlines():
+            if line.startswith((b"\t", b"#")):
+                continue
+            target, colon, rest = line.partition(b":")
+            if not colon or rest.startswith(b"="):
+                continue
+            target = target.rstrip()
+            if not target or not _MAKE_TARGET_CHARS.issuperset(target):
+                continue
+            targets[target.decode("ascii")] = _decode_all(
+                rest.partition(b"#")[0].split()
+            )
 
         return targets
 
-    def _extract_terraform_modules(self, content: str) -> List[str]:
+    def _extract_terraform_modules(self, content: bytes) -> List[str]:
         """Extract Terraform module sources"""
         modules = []
 
         # Match module blocks
-        module_pattern = r'module\s+"[^"]+"\s*\{[^}]*source\s*=\s*"([^"]+)"'
-        modules.extend(re.findall(module_pattern, content, re.DOTALL))
+        modules.extend(_decode_all(_RE_TF_MODULE.findall(content)))
 
-        return sorted(set(modules))
+        return list(dict.fromkeys(modules))
 
-    def _extract_docker_dependencies(self, content: str) -> Dict[str, List[str]]:
+    def _extract_docker_dependencies(self, content: bytes) -> Dict[str, List[str]]:
         """Extract Docker build dependencies"""
         deps = {"base_images": [], "copied_files": [], "stages": []}
 
-        # Base images
-        from_pattern = r"FROM\s+([^\s]+)"
-        deps["base_images"] = re.findall(from_pattern, content)
-
-        # Copied files
-        copy_pattern = r"COPY\s+([^\s]+)"
-        deps["copied_files"] = re.findall(copy_pattern, content)
-
-        # Multi-stage build stages
-        stage_pattern = r"FROM\s+[^\s]+\s+AS\s+([^\s]+)"
-        deps["stages"] = re.findall(stage_pattern, content)
+        for line in content.splitlines():
+            words = line.split()
+            if len(words) < 2:
+                continue
+            if words[0] == b"FROM":
+                # Base image, plus the stage name of a multi-stage build
+                deps["base_images"].append(words[1].decode("utf-8"))
+                if len(words) > 3 and words[2] == b"AS":
+                    deps["stages"].append(words[3].decode("utf-8"))
+            elif words[0] == b"COPY":
+                deps["copied_files"].append(words[1].decode("utf-8"))
 
         return deps
 
-    def _extract_github_actions_deps(self, content: str) -> Dict[str, List[str]]:
+    def _extract_github_actions_deps(self, content: bytes) -> Dict[str, List[str]]:
         """Extract GitHub Actions dependencies"""
         deps = {"actions": [], "workflows": [], "secrets": []}
 
         # GitHub Actions used
-        action_pattern = r"uses:\s*([^\s]+)"
-        deps["actions"] = re.findall(action_pattern, content)
+        deps["actions"] = _decode_all(_RE_GHA_USES.findall(content))
 
         # Workflow calls
-        workflow_pattern = r"workflow_call|workflow_dispatch"
-        deps["workflows"] = re.findall(workflow_pattern, content)
+        deps["workflows"] = _decode_all(_RE_GHA_WORKFLOW.findall(content))
 
         # Secrets referenced
-        secret_pattern = r"\$\{\{\s*secrets\.([^}]+)\s*\}\}"
-        deps["secrets"] = re.findall(secret_pattern, content)
+        deps["secrets"] = _decode_all(_RE_GHA_SECRET.findall(content))
 
         return deps
 
 
+def _run_analyzer(
+    project_root: Path,
+    dep_type: str,
+    name: str,
+    files: List[Path],
+    cache: Dict[str, List[Any]],
+) -> Tuple[Dict[str, Any], Dict[str, List[Any]]]:
+    """Run one analyzer over its files, returning its results with their cache
+    entries; module-level so a worker process receives only its own inputs"""
+    analyzer = DependencyAnalyzer(project_root)
+    analyzer._files = {dep_type: files}
+    analyzer._cache = {dep_type: cache}
+    return getattr(analyzer, name)(), analyzer._fresh_cache[dep_type]
+
+
 class OutputGenerator:
     """Generate various output formats from dependency data"""
 
@@ -315,8 +506,13 @@ class OutputGenerator:
         """Generate JSON dependency manifest"""
         output_file = self.output_dir / "dependencies.json"
 
-        with open(output_file, "w") as f:
-            json.dump(self.dependencies, f, indent=2)
+        if orjson is not None:
+            output_file.write_bytes(
+                orjson.dumps(self.dependencies, option=orjson.OPT_INDENT_2)
+            )
+        else:
+            with open(output_file, "w") as f:
+                json.dump(self.dependencies, f, indent=2)
 
         print(f"📄 JSON manifest: {output_file}")
 
@@ -324,21 +520,26 @@ class OutputGenerator:
         """Generate GraphViz DOT file"""
         output_file = self.output_dir / "dependencies.dot"
 
-        with open(output_file, "w") as f:
-            f.write("digraph ProjectDependencies {\n")
-            f.write("  rankdir=LR;\n")
-            f.write("  node [shape=box];\n\n")
+        # Lines are collected and written in one call rather than one per edge
+        parts = [
+            "digraph ProjectDependencies {\n",
+            "  rankdir=LR;\n",
+            "  node [shape=box];\n\n",
+        ]
 
-            # Python dependencies
-            self._write_python_dot(f)
+        # Python dependencies
+        self._write_python_dot(parts)
 
-            # Makefile dependencies
-            self._write_makefile_dot(f)
+        # Makefile dependencies
+        self._write_makefile_dot(parts)
 
-            # Terraform dependencies
-            self._write_terraform_dot(f)
+        # Terraform dependencies
+        self._write_terraform_dot(parts)
 
-            f.write("}\n")
+        parts.append("}\n")
+
+        with open(output_file, "w") as f:
+            f.write("".join(parts))
 
         print(f"🔗 GraphViz DOT: {output_file}")
 
@@ -363,19 +564,21 @@ class OutputGenerator:
         """Generate Mermaid diagram"""
         output_file = self.output_dir / "dependencies.mmd"
 
-        with open(output_file, "w") as f:
-            f.write("graph TD\n")
+        parts = ["graph TD\n"]
+
+        # Makefile targets
+        for makefile, targets in self.dependencies["makefile"].items():
+            makefile_node = self._mermaid_safe(makefile)
+            for target, deps in targets.items():
+                target_node = self._mermaid_safe(f"{makefile}::{target}")
+                parts.append(f"  {makefile_node} --> {target_node}\n")
 
-            # Makefile targets
-            for makefile, targets in self.dependencies["makefile"].items():
-                makefile_node = self._mermaid_safe(makefile)
-                for target, deps in targets.items():
-                    target_node = self._mermaid_safe(f"{makefile}::{target}")
-                    f.write(f"  {makefile_node} --> {target_node}\n")
+                for dep in deps:
+                    dep_node = self._mermaid_safe(f"{makefile}::{dep}")
+                    parts.append(f"  {dep_node} --> {target_node}\n")
 
-                    for dep in deps:
-                        dep_node = self._mermaid_safe(f"{makefile}::{dep}")
-                        f.write(f"  {dep_node} --> {target_node}\n")
+        with open(output_file, "w") as f:
+            f.write("".join(parts))
 
         print(f"🧜 Mermaid diagram: {output_file}")
 
@@ -419,54 +622,54 @@ class OutputGenerator:
 
         print(f"📋 Summary report: {output_file}")
 
-    def _write_python_dot(self, f):
-        """Write Python dependencies to DOT file"""
+    def _write_python_dot(self, parts: List[str]):
+        """Write Python dependencies to the DOT output"""
         if not self.dependencies["python"]:
             return
 
-        f.write("  // Python Dependencies\n")
+        parts.append("  // Python Dependencies\n")
         for py_file, imports in self.dependencies["python"].items():
             safe_file = self._dot_safe(py_file)
-            f.write(f'  "{safe_file}" [color=blue];\n')
+            parts.append(f'  "{safe_file}" [color=blue];\n')
 
             for import_name in imports:
                 safe_import = self._dot_safe(import_name)
-                f.write(f'  "{safe_import}" -> "{safe_file}" [color=blue];\n')
+                parts.append(f'  "{safe_import}" -> "{safe_file}" [color=blue];\n')
 
-        f.write("\n")
+        parts.append("\n")
 
-    def _write_makefile_dot(self, f):
-        """Write Makefile dependencies to DOT file"""
+    def _write_makefile_dot(self, parts: List[str]):
+        """Write Makefile dependencies to the DOT output"""
         if not self.dependencies["makefile"]:
             return
 
-        f.write("  // Makefile Dependencies\n")
+        parts.append("  // Makefile Dependencies\n")
         for makefile, targets in self.dependencies["makefile"].items():
             for target, deps in targets.items():
                 safe_target = self._dot_safe(f"{makefile}::{target}")
-                f.write(f'  "{safe_target}" [color=green];\n')
+                parts.append(f'  "{safe_target}" [color=green];\n')
 
                 for dep in deps:
                     safe_dep = self._dot_safe(f"{makefile}::{dep}")
-                    f.write(f'  "{safe_dep}" -> "{safe_target}" [color=green];\n')
+                    parts.append(f'  "{safe_dep}" -> "{safe_target}" [color=green];\n')
 
-        f.write("\n")
+        parts.append("\n")
 
-    def _write_terraform_dot(self, f):
-        """Write Terraform dependencies to DOT file"""
+    def _write_terraform_dot(self, parts: List[str]):
+        """Write Terraform dependencies to the DOT output"""
         if not self.dependencies["terraform"]:
             return
 
-        f.write("  // Terraform Dependencies\n")
+        parts.append("  // Terraform Dependencies\n")
         for tf_file, modules in self.dependencies["terraform"].items():
             safe_file = self._dot_safe(tf_file)
-            f.write(f'  "{safe_file}" [color=orange];\n')
+            parts.append(f'  "{safe_file}" [color=orange];\n')
 
             for module in modules:
                 safe_module = self._dot_safe(module)
-                f.write(f'  "{safe_module}" -> "{safe_file}" [color=orange];\n')
+                parts.append(f'  "{safe_module}" -> "{safe_file}" [color=orange];\n')
 
-        f.write("\n")
+        parts.append("\n")
 
     def _dot_safe(self, text: str) -> str:
         """Make text safe for DOT format"""
@@ -474,7 +677,7 @@ class OutputGenerator:
 
     def _mermaid_safe(self, text: str) -> str:
         """Make text safe for Mermaid format"""
-        return re.sub(r"[^a-zA-Z0-9_]", "_", text)
+        return _RE_MERMAID_UNSAFE.sub("_", text)
 
     def _get_timestamp(self) -> str:
         """Get current timestamp"""
@@ -500,6 +703,11 @@ def main():
         default=Path.cwd() / "work" / "dependencies",
         help="Output directory for generated files",
     )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Re-parse every file instead of reusing .cache/deps.json",
+    )
     parser.add_argument(
         "--format",
         choices=["json", "dot", "mermaid", "summary", "all"],
@@ -515,7 +723,7 @@ def main():
         sys.exit(1)
 
     # Run analysis
-    analyzer = DependencyAnalyzer(args.project_root)
+    analyzer = DependencyAnalyzer(args.project_root, use_cache=not args.no_cache)
     dependencies = analyzer.analyze_all()
 
     # Generate outputs